@@ -0,0 +1,184 @@
+import os
+from itertools import chain
+
+import numpy as np
+
+from history import SNAPSHOT_SOURCES
+
+# Smoothing factor of the EWMA baseline used by the breakout score
+EWMA_ALPHA = float(os.getenv("RISING_EWMA_ALPHA", "0.3"))
+
+# Entities with fewer points get no score
+MIN_POINTS = int(os.getenv("RISING_MIN_POINTS", "3"))
+
+# Number of most recent points kept per entity
+RISING_LOOKBACK = int(os.getenv("RISING_LOOKBACK", "96"))
+
+# Signals an entity can be ranked by
+SIGNALS = ("breakout", "growth", "acceleration", "zscore")
+
+# Default metric ranked per source; "trend" is the series embedded in trending hashtags,
+# the others come from the snapshot history.
+RISING_METRICS = {
+    "tweeter": "post_count",
+    "hashtag": "tweet_volume",
+    "trending_keywords": "trending_score",
+    "trending_ads": "like",
+    "trending_hashtags": "trend",
+    "youtube": "view_count",
+    "google_trends": "formatted_traffic",
+}
+
+# Metrics where a lower value is better: their series are negated so that rising means improving
+INVERTED_METRICS = {"rank"}
+
+
+def pad_series(series, length=RISING_LOOKBACK):
+    """
+    Stack series of different lengths into a 2-D array, right-aligned so that the last column
+    holds every entity's latest point; missing points are NaN.
+    :param series: List of sequences of numbers, oldest first.
+    :param length: Number of most recent points kept per series.
+    :return: Float array of shape (len(series), length).
+    """
+    values = np.full((len(series), length), np.nan)
+    if not length:
+        return values
+    tails = [points if len(points) <= length else points[-length:] for points in series]
+    counts = np.fromiter(map(len, tails), dtype=int, count=len(tails))
+    # Row-major order of the mask matches the order of the concatenated tails
+    mask = np.arange(length) >= (length - counts)[:, None]
+    values[mask] = np.fromiter(chain.from_iterable(tails), dtype=float, count=int(counts.sum()))
+    return values
+
+
+def ewma_weights(length, alpha=EWMA_ALPHA):
+    """
+    EWMA weight of each column of right-aligned series, the latest last: alpha * (1 - alpha) ** age.
+    """
+    return alpha * (1 - alpha) ** np.arange(length - 1, -1, -1, dtype=float)
+
+
+def compute_signals(values, alpha=EWMA_ALPHA, min_points=MIN_POINTS):
+    """
+    Compute the trend signals of every entity at once.
+    growth: change of the latest point relative to the previous one (floored at 1 to avoid
+    blowing up near zero); acceleration: change of that growth;
+    zscore: latest point against the mean and deviation of the earlier points;
+    breakout: latest point against an EWMA baseline, in EW standard deviations.
+    :param values: Array from pad_series, one row per entity (series without gaps).
+    :return: Dictionary of signal name (plus "latest" and "points") to an array with one value
+             per entity, NaN where the entity has fewer than `min_points` points.
+    """
+    n, length = values.shape
+    points = np.count_nonzero(~np.isnan(values), axis=1)
+    latest = values[:, -1] if length else np.full(n, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if length >= 3:
+            last, prev, prev2 = values[:, -1], values[:, -2], values[:, -3]
+            growth = (last - prev) / np.maximum(np.abs(prev), 1.0)
+            acceleration = growth - (prev - prev2) / np.maximum(np.abs(prev2), 1.0)
+        else:
+            growth = acceleration = np.full(n, np.nan)
+
+        # Earlier points taken relative to each series' first one, 0 where missing: the sums of
+        # powers below stay accurate for large values, and no NaN-aware reduction is needed
+        history = values[:, :-1]
+        depth = history.shape[1]
+        count = np.maximum(points - 1, 0)
+        first = history[np.arange(n), np.minimum(depth - count, depth - 1)] if depth else np.full(n, np.nan)
+        shifted = np.nan_to_num(history - first[:, None], copy=False)
+        squares = shifted * shifted
+
+        offset = shifted.sum(axis=1) / count
+        mean = first + offset
+        deviation = np.sqrt(np.maximum(squares.sum(axis=1) / count - offset * offset, 0.0))
+        zscore = np.where(deviation > 0, (latest - mean) / deviation, 0.0)
+
+        # EWMA mean and variance as weighted sums, one matrix product each: the incremental update
+        # (mean += alpha * diff, var = (1 - alpha) * (var + alpha * diff ** 2)) gives the variance
+        # around the final mean under the EWMA weights. The first point's own weight is irrelevant,
+        # its shifted value being 0.
+        weights = ewma_weights(depth, alpha)
+        offset = shifted @ weights
+        ewma = first + offset
+        ewvar = np.maximum(squares @ weights - offset * offset, 0.0)
+        scale = np.maximum(np.sqrt(ewvar), 1e-3 * np.maximum(np.abs(ewma), 1.0))
+        breakout = (latest - ewma) / scale
+
+    scored = (points >= min_points) & ~np.isnan(latest)
+    signals = {"growth": growth, "acceleration": acceleration, "zscore": zscore, "breakout": breakout}
+    signals = {name: np.where(scored, signal, np.nan) for name, signal in signals.items()}
+    signals["latest"] = latest
+    signals["points"] = points
+    return signals
+
+
+def top_k(scores, k):
+    """
+    Return the indices of the k highest finite scores, best first, with a partial sort.
+    """
+    scores = np.where(np.isfinite(scores), scores, -np.inf)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=int)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return ranked[np.isfinite(scores[ranked])]
+
+
+def rank_rising(keys, series, by="breakout", k=20, invert=False, lookback=RISING_LOOKBACK, scopes=None):
+    """
+    Rank entities by a trend signal.
+    :param keys: Entity keys.
+    :param series: Series of each entity, oldest point first.
+    :param by: Signal to rank by, one of SIGNALS.
+    :param k: Number of entities returned.
+    :param invert: Negate the series first (for metrics where lower is better, such as a rank).
+    :param scopes: Optional location/region of each entity, returned with it.
+    :return: List of dictionaries with the key, scope (if given), latest value and every signal, best first.
+    """
+    if by not in SIGNALS:
+        raise ValueError(f"Unknown signal '{by}'")
+    values = pad_series(series, lookback)
+    if invert:
+        values = -values
+    signals = compute_signals(values)
+    sign = -1 if invert else 1
+    results = []
+    for index in top_k(signals[by], k):
+        result = {"key": keys[index], "latest": float(sign * signals["latest"][index])}
+        if scopes is not None:
+            result["scope"] = scopes[index]
+        for name in SIGNALS:
+            result[name] = float(signals[name][index])
+        results.append(result)
+    return results
+
+
+def series_from_trend(trend):
+    """
+    Return the values of an embedded {time, value} series, oldest first.
+    """
+    points = sorted((point for point in trend or [] if isinstance(point.get("value"), (int, float))),
+                    key=lambda point: point.get("time") or 0)
+    return [point["value"] for point in points]
+
+
+def snapshot_series_pipeline(source, metric, since, scope=None, lookback=RISING_LOOKBACK):
+    """
+    Aggregation pipeline returning, per entity and location/region of the snapshot history, the last
+    `lookback` values of a metric since `since`, oldest first: {"_id": {"key", "scope"}, "values": [...]}.
+    Series of the same entity in different scopes are kept apart (scope is null for unscoped sources).
+    """
+    if metric not in SNAPSHOT_SOURCES[source]["metrics"]:
+        raise ValueError(f"Metric '{metric}' is not recorded for '{source}'")
+    match = {"meta.source": source, "ts": {"$gte": since}, metric: {"$type": "number"}}
+    if scope is not None:
+        match["meta.scope"] = scope
+    return [
+        {"$match": match},
+        {"$sort": {"ts": 1}},
+        {"$group": {"_id": {"key": "$meta.key", "scope": "$meta.scope"}, "values": {"$push": f"${metric}"}}},
+        {"$project": {"values": {"$slice": ["$values", -lookback]}}},
+    ]
@@ -1,16 +1,108 @@
-from fastapi import FastAPI
-from pymongo import MongoClient
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import base64
+import json
 import os
-from dotenv import load_dotenv
-import pandas as pd
-from transformers import pipeline
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pymongo.errors import PyMongoError
+from fastapi.middleware.cors import CORSMiddleware
+from analytics import (
+    INVERTED_METRICS, RISING_LOOKBACK, RISING_METRICS, SIGNALS, rank_rising, series_from_trend, snapshot_series_pipeline
+)
+from cache import ResponseCache, read_generations
+from db import close_async_client, get_async_database, get_database
+from history import BUCKETS, HISTORY_COLLECTION, SNAPSHOT_SOURCES, ranks_pipeline, series_pipeline
+from metrics import API_REQUEST_SECONDS, CONTENT_TYPE, REGISTRY
+from profiler import PROFILE_DIR, SamplingProfiler
+from registry import COLLECTIONS, META_COLLECTION, ensure_indexes
+from scheduler import STATE_PREFIX
+from search_index import SearchIndex
+from terms import TERM_FIELDS, TERMS_COLLECTION, merge_terms
+from transform_data import TRENDING_SCORE_WEIGHTS
+
+# Connexion à MongoDB, ouverte par le lifespan : l'import du module ne fait aucun accès aux données
+db = None
+collection = None
+collection_keyword = None
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Ouvre la connexion MongoDB au démarrage, crée les index du registre et la ferme à l'arrêt.
+    """
+    global db, collection, collection_keyword
+    db = get_async_database()
+    collection = db["tweeter_trends"]
+    collection_keyword = db["trending_keywords_trends"]
+    try:
+        await asyncio.to_thread(ensure_indexes, get_database())
+    except PyMongoError as e:
+        print(f"Warning: could not create indexes at startup: {e}")
+    # Construction de l'index de recherche en tâche de fond, sans retarder le démarrage ; la référence
+    # gardée sur app.state évite que la tâche soit collectée en cours d'exécution
+    app.state.search_refresh_task = asyncio.create_task(refresh_search_index())
+    app.state.search_refresh_task.add_done_callback(report_task_error)
+    try:
+        yield
+    finally:
+        await cancel_task(app.state.search_refresh_task)
+        if search_refresh is not None:
+            await cancel_task(search_refresh)
+        await close_async_client()
+
+def report_task_error(task):
+    """
+    Affiche l'erreur d'une tâche de fond terminée, qui serait sinon perdue.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warning: background task failed: {task.exception()!r}")
+
+async def cancel_task(task):
+    """
+    Annule une tâche de fond et attend sa fin.
+    """
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+# Cache des réponses, invalidé à chaque fin d'ETL
+response_cache = ResponseCache(lambda: read_generations(db))
 
-# Charger les variables d'environnement
-load_dotenv()
+# Index de recherche inter-plateformes, en mémoire, mis à jour à chaque nouvelle génération ETL
+search_index = SearchIndex()
+search_refresh = None
+
+async def _refresh_search_index(generation):
+    try:
+        await asyncio.to_thread(search_index.refresh, get_database(), generation)
+    except PyMongoError as e:
+        print(f"Warning: could not refresh the search index: {e}")
+
+async def refresh_search_index(wait=True):
+    """
+    Met l'index de recherche à jour si la génération ETL a changé ; seuls les documents modifiés sont relus.
+    Une seule mise à jour à la fois.
+    :param wait: Attendre la fin de la mise à jour ; sinon l'index courant reste servi pendant qu'elle s'exécute.
+    """
+    global search_refresh
+    try:
+        generation = await response_cache.generation()
+    except PyMongoError as e:
+        print(f"Warning: could not read the ETL generation: {e}")
+        return search_index
+    if search_index.generation != generation and (search_refresh is None or search_refresh.done()):
+        search_refresh = asyncio.ensure_future(_refresh_search_index(generation))
+        search_refresh.add_done_callback(report_task_error)
+    if wait and search_refresh is not None and not search_refresh.done():
+        await asyncio.shield(search_refresh)
+    return search_index
 
 # Création de l'application FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Autoriser les requêtes CORS (évite les erreurs de politique de sécurité)
 app.add_middleware(
@@ -21,25 +113,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profilage à la demande : une requête portant l'en-tête "X-Profile: 1" est échantillonnée
+# et son profil écrit dans PROFILE_DIR. Désactivé par défaut.
+API_PROFILING = os.getenv("API_PROFILING", "0") == "1"
 
-# Connexion à MongoDB avec URI sécurisé
-MONGO_URI = os.getenv("MONGO_URI")
-client = MongoClient(MONGO_URI)
-db = client["trends_db"]
-collection = db["tweeter_trends"]
+@app.middleware("http")
+async def instrument(request, call_next):
+    """
+    Mesure la latence de chaque requête par endpoint (chemin de la route, pas l'URL, pour borner
+    le nombre de séries) ; pour une réponse en streaming, jusqu'à l'envoi des en-têtes.
+    """
+    profiler = SamplingProfiler().start() if API_PROFILING and request.headers.get("x-profile") == "1" else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        API_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method=request.method,
+            endpoint=route.path if route is not None else "unmatched", status=status
+        )
+        if profiler is not None:
+            profiler.stop()
+    if profiler is not None:
+        path = os.path.join(PROFILE_DIR, f"api-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.folded")
+        response.headers["X-Profile-Path"] = await asyncio.to_thread(profiler.write, path)
+    return response
+
+@REGISTRY.add_collector
+def _collect_api_metrics():
+    """
+    Expose le cache de réponses et l'index de recherche dans /metrics.
+    """
+    stats = response_cache.stats()
+    yield "api_cache_hits_total", "counter", "Réponses servies par le cache.", [({}, stats["hits"])]
+    yield "api_cache_misses_total", "counter", "Réponses calculées faute d'entrée en cache.", [({}, stats["misses"])]
+    yield "api_cache_hit_ratio", "gauge", "Part des requêtes servies par le cache.", [({}, stats["hit_ratio"])]
+    yield "api_cache_entries", "gauge", "Réponses en cache.", [({}, stats["size"])]
+    yield "search_index_entities", "gauge", "Entités de l'index de recherche.", [({}, len(search_index))]
+
+
+# Pagination de /api/trends
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Champs de tri autorisés et leur sens (1 croissant, -1 décroissant)
+TRENDS_SORT_ORDERS = {"post_count": -1, "rank": 1, "name": 1}
+
+def encode_cursor(doc, sort):
+    """
+    Encode la position du dernier document d'une page (valeur de tri et _id).
+    """
+    position = json.dumps({"v": doc.get(sort), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        value, last_id = position["v"], ObjectId(position["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if value is not None and bson_type(value) is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, last_id
+
+# Types des valeurs de tri, dans l'ordre de comparaison de MongoDB (null les précède tous)
+SORT_VALUE_TYPES = ("number", "string")
+
+def bson_type(value):
+    """
+    Type MongoDB d'une valeur de curseur parmi SORT_VALUE_TYPES, None pour les autres.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    return None
+
+def after_cursor(sort, order, value, last_id):
+    """
+    Filtre keyset sélectionnant les documents situés après (value, last_id) dans l'ordre (sort, _id).
+    Les valeurs manquantes sont triées avant toutes les autres par MongoDB.
+    $lt et $gt ne comparent que des valeurs du même type : les documents d'anciennes ingestions dont
+    le champ de tri est d'un autre type (post_count en chaîne) sont ajoutés par type, selon l'ordre de tri.
+    """
+    id_after = {"$lt": last_id} if order < 0 else {"$gt": last_id}
+    if value is None:
+        if order < 0:
+            return {sort: None, "_id": id_after}
+        return {"$or": [{sort: None, "_id": id_after}, {sort: {"$ne": None}}]}
+    value_after = {"$lt": value} if order < 0 else {"$gt": value}
+    clauses = [{sort: value_after}, {sort: value, "_id": id_after}]
+    position = SORT_VALUE_TYPES.index(bson_type(value))
+    following = SORT_VALUE_TYPES[:position] if order < 0 else SORT_VALUE_TYPES[position + 1:]
+    clauses.extend({sort: {"$type": kind}} for kind in following)
+    if order < 0:
+        clauses.append({sort: None})
+    return {"$or": clauses}
+
+def find_trends(sort, domain, min_post_count, cursor, limit, location_id=None):
+    """
+    Construit la requête MongoDB de /api/trends : filtres, tri et pagination sont exécutés par le serveur.
+    """
+    order = TRENDS_SORT_ORDERS[sort]
+    clauses = []
+    if location_id is not None:
+        clauses.append({"location_id": location_id})
+    if domain is not None:
+        clauses.append({"domain": domain})
+    if min_post_count is not None:
+        clauses.append({"post_count": {"$gte": min_post_count}})
+    if cursor is not None:
+        clauses.append(after_cursor(sort, order, *decode_cursor(cursor)))
+    query = {"$and": clauses} if clauses else {}
+    trends = collection.find(query).sort([(sort, order), ("_id", order)])
+    if limit is not None:
+        trends = trends.limit(limit)
+    return trends
+
+@response_cache.cached(sources=("tweeter",))
+async def get_trends_page(sort, domain, min_post_count, cursor, limit, location_id):
+    trends = await find_trends(sort, domain, min_post_count, cursor, limit, location_id).to_list(length=None)
+    next_cursor = encode_cursor(trends[-1], sort) if len(trends) == limit else None
+    for doc in trends:
+        del doc["_id"]  # Exclure _id
+    return {"trends": trends, "next_cursor": next_cursor}
+
+async def stream_trends(trends):
+    async for doc in trends:
+        del doc["_id"]
+        yield json.dumps(doc, default=str) + "\n"
 
 @app.get("/api/trends")
-def get_trends():
+async def get_trends(
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    sort: str = Query("post_count", enum=list(TRENDS_SORT_ORDERS)),
+    domain: str = None,
+    min_post_count: int = None,
+    location_id: str = None,
+    format: str = Query("json", enum=["json", "ndjson"])
+):
     """
     Récupère les tendances Twitter depuis MongoDB et les retourne sous forme JSON.
+    `location_id` restreint les tendances à un lieu de l'ingestion multi-lieux.
+    Les résultats sont paginés : passer `next_cursor` comme `cursor` pour obtenir la page suivante.
+    Avec format=ndjson, les documents sont envoyés au fil du curseur, une ligne JSON par tendance.
     """
-    data = list(collection.find({}, {"_id": 0}))  # Exclure _id
-    return {"trends": data}
+    if format == "ndjson":
+        trends = find_trends(sort, domain, min_post_count, cursor, limit, location_id)
+        return StreamingResponse(stream_trends(trends), media_type="application/x-ndjson")
+    return await get_trends_page(
+        sort=sort, domain=domain, min_post_count=min_post_count, cursor=cursor, limit=limit or DEFAULT_PAGE_SIZE,
+        location_id=location_id
+    )
 
 # Section de l'API pour les mots-clés tendances
-collection_keyword = db["trending_keywords_trends"]
 @app.get("/api/top_keywords")
-def get_top_keywords():
+@response_cache.cached(sources=("trending_keywords",))
+async def get_top_keywords():
     """
     Récupère les top 10 mots-clés par partage depuis MongoDB.
     """
@@ -49,50 +283,277 @@ def get_top_keywords():
         {"$project": {"_id": 0, "keyword": 1, "share": 1}}  # Include only keyword and share fields
     ]
     
-    top_keywords = list(collection_keyword.aggregate(pipeline))
+    top_keywords = await (await collection_keyword.aggregate(pipeline)).to_list(length=None)
 
     return {"top_keywords": top_keywords}
-####################
 
-data_keywords = pd.DataFrame(list(collection_keyword.find()))
-data_keywords.drop(columns=["_id"], inplace=True)
+@app.get("/api/top_keywords/score")
+@response_cache.cached(sources=("trending_keywords",))
+async def get_top_keywords_score(
+    like: float = None, share: float = None, impression: float = None, limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Fetches the top trending keywords based on trending score.
+    The score stored at ingest is used unless custom weights are given, in which
+    case it is recomputed server-side by an aggregation pipeline.
+    """
+    projection = {"_id": 0, "keyword": 1, "like": 1, "impression": 1, "share": 1, "trending_score": 1,
+                  "sentiment": 1, "topic": 1}
+    custom = {"like": like, "share": share, "impression": impression}
+    weights = {field: TRENDING_SCORE_WEIGHTS[field] if weight is None else weight for field, weight in custom.items()}
+
+    if weights == TRENDING_SCORE_WEIGHTS:
+        # Indexed sort on the precomputed score
+        cursor = collection_keyword.find({}, projection).sort("trending_score", -1).limit(limit)
+        top_trending = await cursor.to_list(length=None)
+    else:
+        score = {"$add": [
+            # Documents written before the typed models may still hold strings: they count as 0
+            {"$multiply": [{"$convert": {"input": f"${field}", "to": "double", "onError": 0, "onNull": 0}}, weight]}
+            for field, weight in weights.items()
+        ]}
+        pipeline = [
+            {"$addFields": {"trending_score": score}},
+            {"$sort": {"trending_score": -1}},
+            {"$limit": limit},
+            {"$project": projection}
+        ]
+        top_trending = await (await collection_keyword.aggregate(pipeline)).to_list(length=None)
 
-    # Convertir les colonnes pertinentes en numérique
-cols_to_convert = ["like", "impression", "share"]
-data_keywords[cols_to_convert] = data_keywords[cols_to_convert].astype(float)
+    if not top_trending:
+        return {"message": "No data available"}
 
-    # Calcul du score de tendance
-data_keywords["trending_score"] = (data_keywords["like"] * 0.5) + (data_keywords["share"] * 0.3) + (data_keywords["impression"] * 0.2)
+    return {"top_keywords": top_trending}
 
-    # Sélectionner les 10 mots-clés les plus tendance
-top_trending = data_keywords.sort_values(by="trending_score", ascending=False).head(10)
+# Historique des snapshots : fenêtre par défaut des séries
+HISTORY_DEFAULT_DAYS = 7
 
-collection_keyword = db["trending_keywords_trends"]
-@app.get("/api/top_keywords/score")
-def get_top_keywords():
+def history_window(source, start, end):
     """
-    Fetches the top 10 trending keywords based on trending score.
+    Vérifie la source et complète la fenêtre [start, end) : par défaut les HISTORY_DEFAULT_DAYS derniers jours.
+    Les dates sans fuseau sont interprétées en UTC.
     """
-    # Retrieve data from MongoDB
-    data = list(collection_keyword.find({}, {"_id": 0, "keyword": 1, "like": 1, "impression": 1, "share": 1}))
+    if source not in SNAPSHOT_SOURCES:
+        raise HTTPException(status_code=404, detail=f"No history for source '{source}'")
+    start, end = (value.replace(tzinfo=timezone.utc) if value and value.tzinfo is None else value for value in (start, end))
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=HISTORY_DEFAULT_DAYS)
+    return start, end
 
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
+async def run_history_pipeline(build, *args, **kwargs):
+    try:
+        pipeline = build(*args, **kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await (await db[HISTORY_COLLECTION].aggregate(pipeline)).to_list(length=None)
 
-    if df.empty:
-        return {"message": "No data available"}
+# Tableau de bord : taille de chaque panneau et champs envoyés
+DASHBOARD_TOP = 10
+DASHBOARD_TABLE_SIZE = 1000
+DASHBOARD_TREND_FIELDS = {
+    "_id": 0, "name": 1, "post_count": 1, "rank": 1, "domain": 1, "location_id": 1, "sentiment": 1, "topic": 1
+}
+DASHBOARD_KEYWORD_FIELDS = {
+    "_id": 0, "keyword": 1, "like": 1, "impression": 1, "share": 1, "trending_score": 1, "sentiment": 1, "topic": 1
+}
+
+@response_cache.cached(sources=("tweeter", "trending_keywords"))
+async def load_dashboard(table_size):
+    trends_by_posts = [("post_count", -1), ("_id", -1)]
+    table_query = (
+        collection.find({}, DASHBOARD_TREND_FIELDS).sort(trends_by_posts).limit(table_size).to_list(length=None)
+        if table_size else asyncio.sleep(0, result=[])
+    )
+    top_trends, trends_table, by_share, by_score = await asyncio.gather(
+        collection.find({}, {"_id": 0, "name": 1, "post_count": 1}).sort(trends_by_posts).limit(DASHBOARD_TOP)
+        .to_list(length=None),
+        table_query,
+        collection_keyword.find({}, {"_id": 0, "keyword": 1, "share": 1}).sort("share", -1).limit(DASHBOARD_TOP)
+        .to_list(length=None),
+        collection_keyword.find({}, DASHBOARD_KEYWORD_FIELDS).sort("trending_score", -1).limit(DASHBOARD_TOP)
+        .to_list(length=None),
+    )
+    return {
+        "top_trends": top_trends,
+        "trends_table": trends_table,
+        "top_keywords_by_share": by_share,
+        "top_keywords_by_score": by_score,
+    }
+
+@app.get("/api/dashboard")
+async def get_dashboard(table_size: int = Query(DASHBOARD_TABLE_SIZE, ge=0, le=MAX_PAGE_SIZE)):
+    """
+    Toutes les données du tableau de bord Streamlit en une réponse, déjà mises en forme par panneau :
+    top tendances, table des tendances, top mots-clés par partage et par score.
+    Les requêtes MongoDB sont exécutées en parallèle, sur les index du registre.
+    """
+    panels = await load_dashboard(table_size=table_size)
+    return dict(panels, generation=await response_cache.generation())
+
+@app.get("/api/history/{source}/series")
+@response_cache.cached(sources=lambda kwargs: (kwargs["source"],))
+async def get_history_series(
+    source: str,
+    key: str,
+    scope: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    bucket: str = Query("1h", enum=list(BUCKETS))
+):
+    """
+    Série temporelle d'une entité (ex. un hashtag, un mot-clé, une vidéo) : dernière valeur
+    de chaque métrique par intervalle `bucket`, agrégée par le serveur.
+    `scope` (lieu ou région) est obligatoire pour les sources multi-lieux/régions.
+    """
+    start, end = history_window(source, start, end)
+    points = await run_history_pipeline(series_pipeline, source, key, start, end, bucket, scope)
+    return {"source": source, "key": key, "scope": scope, "bucket": bucket, "points": points}
 
-    # Convert columns to numeric
-    cols_to_convert = ["like", "impression", "share"]
-    df[cols_to_convert] = df[cols_to_convert].apply(pd.to_numeric, errors="coerce").fillna(0)
+@app.get("/api/history/{source}/ranks")
+@response_cache.cached(sources=lambda kwargs: (kwargs["source"],))
+async def get_history_ranks(
+    source: str,
+    scope: str = None,
+    start: datetime = None,
+    end: datetime = None,
+    bucket: str = Query("1h", enum=list(BUCKETS)),
+    keys: str = None,
+    top: int = Query(10, ge=1, le=100)
+):
+    """
+    Classement dans le temps : pour chaque intervalle `bucket`, le rang des entités selon la
+    métrique de classement de la source. `keys` (séparées par des virgules) suit des entités
+    précises, sinon les `top` premières de chaque intervalle sont retournées.
+    `scope` (lieu ou région) est obligatoire pour les sources multi-lieux/régions.
+    """
+    start, end = history_window(source, start, end)
+    key_list = [item for item in keys.split(",") if item] if keys else None
+    buckets = await run_history_pipeline(ranks_pipeline, source, start, end, bucket, scope, key_list, top)
+    metric, order = SNAPSHOT_SOURCES[source]["rank_by"]
+    return {
+        "source": source, "scope": scope, "bucket": bucket, "rank_by": metric,
+        "order": "asc" if order > 0 else "desc", "buckets": buckets
+    }
 
-    # Calculate trending score dynamically
-    df["trending_score"] = (df["like"] * 0.5) + (df["share"] * 0.3) + (df["impression"] * 0.2)
+# Fenêtre d'historique analysée par /api/rising
+RISING_WINDOW_DAYS = 7
 
-    # Select the top 10 keywords based on trending score
-    top_trending = df.sort_values(by="trending_score", ascending=False).head(10)
+async def load_rising_series(source, metric, scope):
+    """
+    Charge les séries à classer : la série `trend` intégrée aux hashtags TikTok, ou l'historique des snapshots,
+    une série par entité et par lieu/région.
+    :return: (liste des clés, liste des séries, liste des lieux/régions ou None).
+    """
+    if metric == "trend":
+        if source != "trending_hashtags":
+            raise HTTPException(status_code=400, detail="The 'trend' metric only exists for trending_hashtags")
+        cursor = db[COLLECTIONS[source]["collection"]].find({}, {"_id": 0, "hashtag_name": 1, "trend": 1})
+        docs = await cursor.to_list(length=None)
+        return [doc.get("hashtag_name") for doc in docs], [series_from_trend(doc.get("trend")) for doc in docs], None
+    since = datetime.now(timezone.utc) - timedelta(days=RISING_WINDOW_DAYS)
+    try:
+        pipeline = snapshot_series_pipeline(source, metric, since, scope, RISING_LOOKBACK)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    docs = await (await db[HISTORY_COLLECTION].aggregate(pipeline, allowDiskUse=True)).to_list(length=None)
+    return ([doc["_id"]["key"] for doc in docs], [doc["values"] for doc in docs],
+            [doc["_id"].get("scope") for doc in docs])
 
-    return {"top_keywords": top_trending.to_dict(orient="records")}
+@app.get("/api/rising")
+@response_cache.cached(sources=lambda kwargs: (kwargs["source"],))
+async def get_rising(
+    source: str = Query("trending_hashtags", enum=list(RISING_METRICS)),
+    metric: str = None,
+    by: str = Query("breakout", enum=list(SIGNALS)),
+    k: int = Query(20, ge=1, le=1000),
+    scope: str = None
+):
+    """
+    Entités en forte progression : croissance, accélération, z-score du dernier point et score
+    de « breakout » (écart à une moyenne mobile exponentielle), calculés en un passage vectorisé.
+    Les `k` meilleures selon `by` sont retournées ; pour les sources multi-lieux/régions, chaque entité
+    est classée par lieu ou région (champ `scope`), sauf si `scope` en restreint un seul.
+    """
+    metric = metric or RISING_METRICS[source]
+    keys, series, scopes = await load_rising_series(source, metric, scope)
+    # Calcul NumPy hors de la boucle d'événements
+    rising = await asyncio.to_thread(rank_rising, keys, series, by, k, metric in INVERTED_METRICS, scopes=scopes)
+    return {"source": source, "metric": metric, "by": by, "entities": len(keys), "rising": rising}
+
+def term_sources(sources):
+    """
+    Sources demandées à /api/terms (séparées par des virgules), toutes par défaut.
+    """
+    return [name for name in sources.split(",") if name] if sources else list(TERM_FIELDS)
+
+@app.get("/api/terms")
+@response_cache.cached(sources=lambda kwargs: term_sources(kwargs["sources"]))
+async def get_terms(sources: str = None, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Fréquences des termes (noms de tendances Twitter, mots-clés et hashtags TikTok, titres YouTube),
+    calculées à l'ingestion. `sources` (séparées par des virgules) restreint les sources fusionnées.
+    """
+    names = term_sources(sources)
+    unknown = [name for name in names if name not in TERM_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"No term frequencies for: {', '.join(unknown)}")
+    docs = await db[TERMS_COLLECTION].find({"_id": {"$in": names}}).to_list(length=None)
+    return {"sources": names, "terms": merge_terms(docs, limit)}
+
+@app.get("/api/search")
+async def search(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=100)):
+    """
+    Autocomplétion sur les entités de toutes les plateformes (tendances et hashtags Twitter, tags TikTok générés,
+    mots-clés et hashtags TikTok, requêtes Google Trends), par préfixe du nom normalisé :
+    "#World Cup" et "worldcup" désignent la même entité.
+    """
+    # Le premier appel attend la construction de l'index, les suivants servent l'index courant
+    index = await refresh_search_index(wait=search_index.generation is None)
+    return {"query": q, "results": index.search(q, limit)}
+
+@app.get("/api/entity/{key}")
+async def get_entity(key: str):
+    """
+    Vue inter-plateformes d'une entité : ses documents sur chaque plateforme.
+    `key` est la clé renvoyée par /api/search ou n'importe quelle graphie du nom.
+    """
+    # Le premier appel attend la construction de l'index, les suivants servent l'index courant
+    index = await refresh_search_index(wait=search_index.generation is None)
+    entity = index.entity(key)
+    if entity is None:
+        raise HTTPException(status_code=404, detail=f"Unknown entity '{key}'")
+    return entity
+
+@app.get("/api/generation")
+async def get_generation():
+    """
+    Génération ETL courante : elle change à chaque fin d'ETL, les clients s'en servent comme clé de cache.
+    """
+    return {"generation": await response_cache.generation()}
+
+@app.get("/api/schedule")
+async def get_schedule():
+    """
+    État du planificateur ETL : intervalle adapté, prochaine exécution, dernier résultat et exécution
+    en cours de chaque source, la prochaine à s'exécuter en premier.
+    """
+    cursor = db[META_COLLECTION].find({"_id": {"$regex": f"^{STATE_PREFIX}"}}, {"_id": 0, "last_summary": 0})
+    sources = await cursor.sort("next_run_at", 1).to_list(length=None)
+    return {"now": datetime.now(timezone.utc), "sources": sources}
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Métriques Prometheus (format texte) : latence par endpoint, cache, allers-retours MongoDB.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """
+    Statistiques du cache de réponses : génération ETL, taille, hits et misses.
+    """
+    return response_cache.stats()
 
 
 # Lancer l'application via uvicorn
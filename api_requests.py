@@ -1,154 +1,466 @@
+import contextlib
+import contextvars
 import http.client
 import json
-from datetime import datetime
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 
-def get_hashtag_info(api_key, tag="viral"):
+from metrics import ETL_BYTES_RECEIVED, ETL_STAGE_SECONDS, REGISTRY, current_source, stage
+
+# Default socket timeout (seconds) for a single RapidAPI request.
+REQUEST_TIMEOUT = float(os.getenv("RAPIDAPI_TIMEOUT", "30"))
+
+# Optional redirection of RapidAPI hosts, e.g. to a local fake server:
+# {"yt-api.p.rapidapi.com": "http://127.0.0.1:8081"}. RAPIDAPI_BASE_URL
+# redirects every host at once.
+HOST_OVERRIDES = {}
+
+# Idle keep-alive connections per RapidAPI host.
+_idle_connections = {}
+_pool_lock = threading.Lock()
+
+# Request rate allowed by each plan, as (requests per second, burst size).
+# RAPIDAPI_RATE_LIMITS overrides it with JSON: {"yt-api.p.rapidapi.com": [5, 10]}.
+HOST_RATE_LIMITS = {
+    "yt-api.p.rapidapi.com": (5, 5),
+    "twitter-trends-by-location.p.rapidapi.com": (1, 2),
+    "trending-twitter-hashtags.p.rapidapi.com": (1, 2),
+    "youtube-tag-generator-api-viral-tiktok-tags-hashtags.p.rapidapi.com": (1, 2),
+    "tiktok-creative-center-api.p.rapidapi.com": (2, 4),
+    "google-trends8.p.rapidapi.com": (2, 4),
+}
+HOST_RATE_LIMITS.update({
+    host: tuple(limit) for host, limit in json.loads(os.getenv("RAPIDAPI_RATE_LIMITS", "{}")).items()
+})
+DEFAULT_RATE_LIMIT = (1, 1)
+
+# Retries on 429, 5xx and network errors, with jittered exponential backoff.
+MAX_RETRIES = int(os.getenv("RAPIDAPI_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("RAPIDAPI_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("RAPIDAPI_BACKOFF_MAX", "30"))
+
+
+class APIRequestError(Exception):
+    """
+    Raised when a RapidAPI request keeps failing or returns a non-retryable error status.
+    """
+
+    def __init__(self, host, status, body=""):
+        super().__init__(f"{host} answered HTTP {status}: {body[:200]}")
+        self.host = host
+        self.status = status
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request cannot complete, retries and backoff included, before the deadline of its task.
+    """
+
+
+# Monotonic time by which the requests of the current task must be done, None for no deadline
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextlib.contextmanager
+def request_deadline(seconds):
+    """
+    Bound every request sent within the block, retries and backoff included, to `seconds` from now.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _time_left(deadline, host, path):
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded(f"{host}{path}: deadline reached")
+    return left
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, sleeping until it is available.
+        :return: Time spent waiting, in seconds.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token now, even if it is only available later, so waiters queue fairly.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# Per-host counters: requests, retries, errors, wait_seconds (throttling + backoff), fetch_seconds
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _bucket(host):
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(*HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT))
+        return _buckets[host]
+
+
+def _record(host, **increments):
+    with _metrics_lock:
+        counters = _metrics.setdefault(
+            host, {"requests": 0, "retries": 0, "errors": 0, "wait_seconds": 0.0, "fetch_seconds": 0.0}
+        )
+        for name, value in increments.items():
+            counters[name] += value
+
+
+def get_request_metrics():
+    """
+    Return a copy of the per-host request counters.
+    """
+    with _metrics_lock:
+        return {host: dict(counters) for host, counters in _metrics.items()}
+
+
+@REGISTRY.add_collector
+def _collect_request_metrics():
+    """
+    Export the per-host request counters to /metrics.
+    """
+    hosts = get_request_metrics()
+    for name, help in (
+        ("requests", "RapidAPI requests sent, retries included."),
+        ("retries", "RapidAPI requests retried."),
+        ("errors", "RapidAPI requests failed (network error or error status)."),
+        ("wait_seconds", "Time spent waiting for the rate limit or a retry backoff."),
+        ("fetch_seconds", "Time spent in RapidAPI requests."),
+    ):
+        yield f"rapidapi_{name}_total", "counter", help, [({"host": host}, counters[name]) for host, counters in hosts.items()]
+
+
+def _source_label(host):
+    # Source set by the ETL around its fetches, the host for other callers
+    return current_source() or host
+
+
+def _retry_delay(attempt, retry_after=None):
+    """
+    Delay before the next attempt: the server's Retry-After when given, full-jitter backoff otherwise.
+    """
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                return min(BACKOFF_MAX, max(0.0, delay))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _connect(host, timeout):
+    """
+    Open a new connection to a RapidAPI host, honouring HOST_OVERRIDES.
+    """
+    target = HOST_OVERRIDES.get(host) or os.getenv("RAPIDAPI_BASE_URL")
+    if not target:
+        return http.client.HTTPSConnection(host, timeout=timeout)
+    url = urlsplit(target)
+    if url.scheme == "http":
+        return http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+    return http.client.HTTPSConnection(url.hostname, url.port, timeout=timeout)
+
+
+def _acquire_connection(host, timeout):
+    with _pool_lock:
+        idle = _idle_connections.get(host)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        return _connect(host, timeout), False
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn, True
+
+
+def _release_connection(host, conn):
+    with _pool_lock:
+        _idle_connections.setdefault(host, []).append(conn)
+
+
+def close_connections():
+    """
+    Close every pooled keep-alive connection.
+    """
+    with _pool_lock:
+        pools = list(_idle_connections.values())
+        _idle_connections.clear()
+    for idle in pools:
+        for conn in idle:
+            conn.close()
+
+
+def _send(host, method, path, body, headers, timeout):
+    """
+    Send one request over a pooled keep-alive connection.
+    :return: Tuple of (connection, response), the response body still unread.
+    """
+    conn, reused = _acquire_connection(host, timeout)
+    try:
+        try:
+            conn.request(method, path, body, headers)
+            res = conn.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # The server dropped an idle keep-alive connection: retry once on a fresh one.
+            if not reused:
+                raise
+            conn.close()
+            conn = _connect(host, timeout)
+            conn.request(method, path, body, headers)
+            res = conn.getresponse()
+    except Exception:
+        conn.close()
+        raise
+    return conn, res
+
+
+def _finish(host, conn, res):
+    """
+    Return the connection to the pool if its response was fully read and it may be kept alive.
+    """
+    if res.will_close or not res.isclosed():
+        conn.close()
+    else:
+        _release_connection(host, conn)
+
+
+def _read(host, conn, res):
+    try:
+        data = res.read()
+    except Exception:
+        conn.close()
+        raise
+    _finish(host, conn, res)
+    ETL_BYTES_RECEIVED.inc(len(data), source=_source_label(host))
+    return data
+
+
+def _open(host, method, path, api_key, body, extra_headers, timeout, read):
+    """
+    Send a request within the host's rate limit, retrying 429, 5xx and network errors.
+    Within a request_deadline block, socket timeouts and retries stop at the deadline.
+    :param read: Read the whole body (returned as bytes) instead of returning the open response.
+    :return: Body bytes if `read`, otherwise a tuple of (connection, response) with a 2xx status.
+    :raises APIRequestError: On a non-retryable error status or once retries are exhausted.
+    :raises DeadlineExceeded: If the deadline is reached before a response.
+    """
+    headers = {
+        'x-rapidapi-key': api_key,
+        'x-rapidapi-host': host
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+    timeout = REQUEST_TIMEOUT if timeout is None else timeout
+    bucket = _bucket(host)
+    deadline = _deadline.get()
+
+    for attempt in range(MAX_RETRIES + 1):
+        _record(host, wait_seconds=bucket.acquire())
+        left = _time_left(deadline, host, path)
+        start = time.monotonic()
+        retry_after = None
+        try:
+            conn, res = _send(host, method, path, body, headers, timeout if left is None else min(timeout, left))
+            if 200 <= res.status < 300 and not read:
+                elapsed = time.monotonic() - start
+                _record(host, requests=1, fetch_seconds=elapsed)
+                # Time to the response headers: the body is read while it is parsed
+                ETL_STAGE_SECONDS.observe(elapsed, stage="fetch", source=_source_label(host))
+                return conn, _CountingResponse(res, _source_label(host))
+            data = _read(host, conn, res)
+        except (OSError, http.client.HTTPException) as e:
+            # Network errors and timeouts (socket.timeout is an OSError)
+            _record(host, requests=1, errors=1, fetch_seconds=time.monotonic() - start)
+            if attempt == MAX_RETRIES:
+                raise
+            error = e
+        else:
+            elapsed = time.monotonic() - start
+            _record(host, requests=1, fetch_seconds=elapsed)
+            if 200 <= res.status < 300:
+                ETL_STAGE_SECONDS.observe(elapsed, stage="fetch", source=_source_label(host))
+                return data
+            _record(host, errors=1)
+            error = APIRequestError(host, res.status, data.decode("utf-8", "replace"))
+            if (res.status != 429 and res.status < 500) or attempt == MAX_RETRIES:
+                raise error
+            retry_after = res.headers.get("Retry-After")
+
+        delay = _retry_delay(attempt, retry_after)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise DeadlineExceeded(f"{host}{path}: deadline reached after {attempt + 1} attempts ({error})") from error
+        print(f"Warning: {host}{path} failed ({error}), retrying in {delay:.1f}s")
+        _record(host, retries=1, wait_seconds=delay)
+        time.sleep(delay)
+
+
+class _CountingResponse:
+    """
+    Response wrapper counting the bytes read by a stream parser.
+    """
+
+    def __init__(self, res, source):
+        self._res = res
+        self._source = source
+
+    def read(self, *args):
+        data = self._res.read(*args)
+        ETL_BYTES_RECEIVED.inc(len(data), source=self._source)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._res, name)
+
+
+def _stream(host, conn, res, parse):
+    complete = False
+    try:
+        yield from parse(res)
+        res.read()  # Drain anything after the parsed document
+        complete = True
+    finally:
+        if complete:
+            _finish(host, conn, res)
+        else:
+            conn.close()
+
+
+def _request(host, method, path, api_key, body=None, extra_headers=None, timeout=None, parse=None):
+    """
+    Send a request to a RapidAPI host, within the host's rate limit and with bounded retries.
+    :param host: RapidAPI host, also sent as the x-rapidapi-host header.
+    :param method: HTTP method.
+    :param path: Request path including the query string.
+    :param api_key: Your RapidAPI key.
+    :param body: Optional request body.
+    :param extra_headers: Optional additional headers.
+    :param timeout: Socket timeout in seconds (default: REQUEST_TIMEOUT).
+    :param parse: Optional function consuming the binary response stream and yielding items,
+                  e.g. transform_data.iter_stream_records; the body is then never held in memory.
+    :return: Decoded JSON response, or a generator of the items yielded by `parse`.
+    :raises APIRequestError: On a non-retryable error status or once retries are exhausted.
+    """
+    if parse is not None:
+        conn, res = _open(host, method, path, api_key, body, extra_headers, timeout, read=False)
+        return _stream(host, conn, res, parse)
+    data = _open(host, method, path, api_key, body, extra_headers, timeout, read=True)
+    with stage("decode", _source_label(host)):
+        return json.loads(data.decode("utf-8"))
+
+def get_hashtag_info(api_key, tag="viral", parse=None):
     """
     Fetch information about a specific hashtag.
     :param api_key: Your RapidAPI key.
     :param tag: Hashtag to search for (default: "viral").
+    :param parse: Optional stream parser, see _request.
     :return: JSON response containing hashtag information.
     """
-    conn = http.client.HTTPSConnection("yt-api.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "yt-api.p.rapidapi.com"
-    }
-    conn.request("GET", f"/hashtag?tag={tag}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request("yt-api.p.rapidapi.com", "GET", f"/hashtag?tag={tag}", api_key, parse=parse)
 
-def get_trends_by_location(location_id, api_key):
+def get_trends_by_location(location_id, api_key, parse=None):
     """
     Fetch trending topics for a specific location.
     """
-    conn = http.client.HTTPSConnection("twitter-trends-by-location.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "twitter-trends-by-location.p.rapidapi.com"
-    }
-    conn.request("GET", f"/location/{location_id}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request("twitter-trends-by-location.p.rapidapi.com", "GET", f"/location/{location_id}", api_key, parse=parse)
 
-def get_locations(api_key):
+def get_locations(api_key, parse=None):
     """
     Fetch available locations for trending topics.
     """
-    conn = http.client.HTTPSConnection("twitter-trends-by-location.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "twitter-trends-by-location.p.rapidapi.com"
-    }
-    conn.request("GET", "/locations", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request("twitter-trends-by-location.p.rapidapi.com", "GET", "/locations", api_key, parse=parse)
 
-def get_trending_hashtags(api_key):
+def get_trending_hashtags(api_key, parse=None):
     """
     Fetch trending Twitter hashtags.
     """
-    conn = http.client.HTTPSConnection("trending-twitter-hashtags.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "trending-twitter-hashtags.p.rapidapi.com",
-        'Content-Type': "application/json"
-    }
     payload = json.dumps({"key1": "value", "key2": "value"})
-    conn.request("POST", "/getTrendingTwitterHashtags", payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request(
+        "trending-twitter-hashtags.p.rapidapi.com", "POST", "/getTrendingTwitterHashtags", api_key,
+        body=payload, extra_headers={'Content-Type': "application/json"}, parse=parse
+    )
 
-def generate_tiktok_tags(api_key, content="trends", trend="viral", language="en", noqueue=1, count=20):
+def generate_tiktok_tags(api_key, content="trends", trend="viral", language="en", noqueue=1, count=20, parse=None):
     """
     Fetch TikTok tags based on trends.
     """
-    conn = http.client.HTTPSConnection("youtube-tag-generator-api-viral-tiktok-tags-hashtags.p.rapidapi.com")
     payload = json.dumps({"content": content})
+    return _request(
+        "youtube-tag-generator-api-viral-tiktok-tags-hashtags.p.rapidapi.com", "POST",
+        f"/generateTikTokTags?trend={trend}&language={language}&noqueue={noqueue}&count={count}", api_key,
+        body=payload, extra_headers={'Content-Type': "application/json"}, parse=parse
+    )
 
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "youtube-tag-generator-api-viral-tiktok-tags-hashtags.p.rapidapi.com",
-        'Content-Type': "application/json"
-    }
-    conn.request("POST", f"/generateTikTokTags?trend={trend}&language={language}&noqueue={noqueue}&count={count}", payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
-
-def get_trending_keywords(api_key, page=1, limit=20, period=7, country="US"):
+def get_trending_keywords(api_key, page=1, limit=20, period=7, country="US", parse=None):
     """
     Fetch trending keywords on TikTok.
     """
-    conn = http.client.HTTPSConnection("tiktok-creative-center-api.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "tiktok-creative-center-api.p.rapidapi.com"
-    }
-    conn.request("GET", f"/api/trending/keyword?page={page}&limit={limit}&period={period}&country={country}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request(
+        "tiktok-creative-center-api.p.rapidapi.com", "GET",
+        f"/api/trending/keyword?page={page}&limit={limit}&period={period}&country={country}", api_key, parse=parse
+    )
 
-def get_top_ads(api_key, page=1, limit=20, period=7, country="US", order_by="ctr"):
+def get_top_ads(api_key, page=1, limit=20, period=7, country="US", order_by="ctr", parse=None):
     """
     Fetch top TikTok ads.
     """
-    conn = http.client.HTTPSConnection("tiktok-creative-center-api.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "tiktok-creative-center-api.p.rapidapi.com"
-    }
-    conn.request("GET", f"/api/trending/ads?page={page}&limit={limit}&period={period}&country={country}&order_by={order_by}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request(
+        "tiktok-creative-center-api.p.rapidapi.com", "GET",
+        f"/api/trending/ads?page={page}&limit={limit}&period={period}&country={country}&order_by={order_by}", api_key, parse=parse
+    )
 
-def get_trending_videos(api_key, geo="US"):
+def get_trending_videos(api_key, geo="US", parse=None):
     """
     Fetch trending YouTube videos for a specific region.
     """
-    conn = http.client.HTTPSConnection("yt-api.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "yt-api.p.rapidapi.com"
-    }
-    conn.request("GET", f"/trending?geo={geo}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request("yt-api.p.rapidapi.com", "GET", f"/trending?geo={geo}", api_key, parse=parse)
 
-def get_google_trends(api_key):
+def get_google_trends(api_key, region_code="US", hl="en-US", parse=None):
     """
-    Fetch Google's trending data.
+    Fetch Google's trending data for a region.
     """
-    conn = http.client.HTTPSConnection("google-trends8.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "google-trends8.p.rapidapi.com"
-    }
     today_date = datetime.now().strftime("%Y-%m-%d")
-    endpoint = f"/trendings?region_code=US&hl=en-US&date={today_date}"
-
-    conn.request("GET", endpoint, headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    endpoint = f"/trendings?region_code={region_code}&hl={hl}&date={today_date}"
+    return _request("google-trends8.p.rapidapi.com", "GET", endpoint, api_key, parse=parse)
 
-def get_google_regions(api_key):
+def get_google_regions(api_key, parse=None):
     """
     Fetch available regions for Google Trends.
     """
-    conn = http.client.HTTPSConnection("google-trends8.p.rapidapi.com")
-    headers = {
-        'x-rapidapi-key': api_key,
-        'x-rapidapi-host': "google-trends8.p.rapidapi.com"
-    }
-    conn.request("GET", "/regions", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    return json.loads(data.decode("utf-8"))
+    return _request("google-trends8.p.rapidapi.com", "GET", "/regions", api_key, parse=parse)
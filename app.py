@@ -1,3 +1,5 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import requests
 import pandas as pd
@@ -9,20 +11,60 @@ from wordcloud import WordCloud
 st.set_page_config(page_title="Twitter Trends Dashboard", layout='wide')
 FASTAPI_URL = "http://127.0.0.1:8000"
 
-# 🔹 Fonction pour récupérer les données via l'API
-@st.cache_data  # Utilisation de @st.cache_data au lieu de @st.cache_resource pour Streamlit v1.22+
-def get_data():
+# Durée maximale (secondes) de mise en cache des données, même sans nouvelle génération ETL
+DASHBOARD_TTL = 600
+
+# 🔹 Session HTTP partagée : connexions keep-alive réutilisées d'un rerun à l'autre
+@st.cache_resource
+def get_session():
+    return requests.Session()
+
+# 🔹 Génération ETL courante : elle change à chaque fin d'ETL et sert de clé de cache
+def get_generation():
     try:
-        response = requests.get(f"{FASTAPI_URL}/api/trends")
+        response = get_session().get(f"{FASTAPI_URL}/api/generation", timeout=5)
         response.raise_for_status()
-        data = response.json()["trends"]
-        return pd.DataFrame(data)
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération des données : {e}")
-        return pd.DataFrame()
+        return response.json()["generation"]
+    except requests.exceptions.RequestException:
+        return None
+
+def fetch_dashboard():
+    response = get_session().get(f"{FASTAPI_URL}/api/dashboard", timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+# 🔹 Nuage de mots rendu à partir des fréquences calculées à l'ingestion
+def render_wordcloud():
+    response = get_session().get(f"{FASTAPI_URL}/api/terms", params={"limit": 200}, timeout=10)
+    response.raise_for_status()
+    frequencies = {item["term"]: item["count"] for item in response.json()["terms"]}
+    if not frequencies:
+        return None
+    image = WordCloud(width=800, height=400, background_color="white").generate_from_frequencies(frequencies).to_image()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# 🔹 Données de la page, chargées une fois par génération ETL : le tableau de bord et le nuage de mots
+# sont récupérés en parallèle ; une erreur sur le nuage de mots n'empêche pas l'affichage du reste.
+@st.cache_data(ttl=DASHBOARD_TTL, max_entries=4)
+def load_page(generation):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        dashboard = executor.submit(fetch_dashboard)
+        wordcloud = executor.submit(render_wordcloud)
+        try:
+            wordcloud_png = wordcloud.result()
+        except requests.exceptions.RequestException:
+            wordcloud_png = None
+        return dashboard.result(), wordcloud_png
 
 # Charger les données
-data = get_data()
+try:
+    dashboard, wordcloud_png = load_page(get_generation())
+except requests.exceptions.RequestException as e:
+    st.error(f"Erreur lors de la récupération des données : {e}")
+    dashboard, wordcloud_png = {}, None
+data = pd.DataFrame(dashboard.get("trends_table", []))
 
 # 🔹 Affichage du titre et de la description du dashboard
 st.title("📊 Twitter Trends Dashboard")
@@ -32,8 +74,8 @@ st.markdown("Ce dashboard analyse les tendances Twitter stockées dans MongoDB."
 if data.empty:
     st.warning("⚠️ Aucune donnée trouvée dans la base de données.")
 else:
-    # 🔹 Trier les tendances par `post_count`
-    top_trends = data.sort_values(by="post_count", ascending=False).head(10)
+    # 🔹 Tendances déjà triées par `post_count` par l'API
+    top_trends = pd.DataFrame(dashboard["top_trends"])
 
     # 🔹 Graphique des tendances
     st.subheader("📈 Top 10 des tendances Twitter")
@@ -42,13 +84,10 @@ else:
 
     # 🔹 Génération d'un nuage de mots
     st.subheader("☁️ Nuage de mots des tendances")
-    text = " ".join(data["name"].astype(str))
-    wordcloud = WordCloud(width=800, height=400, background_color="white").generate(text)
-    
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.imshow(wordcloud, interpolation="bilinear")
-    ax.axis("off")
-    st.pyplot(fig)
+    if wordcloud_png:
+        st.image(wordcloud_png, use_column_width=True)
+    else:
+        st.info("Aucune fréquence de termes disponible pour le moment.")
 
     # 🔹 Affichage des données sous forme de tableau interactif
     st.subheader("📋 Données des tendances")
@@ -57,18 +96,17 @@ else:
 # 🔹 Footer
 st.markdown("**📌 Twitter Trends Dashboard - Powered by MongoDB & Streamlit 🚀**")
 
-# 🔹 Second API Call for Top Keywords by Shares
-response = requests.get(f"{FASTAPI_URL}/api/top_keywords")
-data = response.json()
+# 🔹 Top Keywords by Shares, from the dashboard response
+top_keywords_by_share = dashboard.get("top_keywords_by_share", [])
 
 # Extract the keywords and shares from the response
-keywords = [item['keyword'] for item in data['top_keywords']]
-shares = [item['share'] for item in data['top_keywords']]
+keywords = [item['keyword'] for item in top_keywords_by_share]
+shares = [item['share'] for item in top_keywords_by_share]
 
 # 🔹 Create the Plotly bar chart
 #fig = go.Figure(data=[go.Bar(x=keywords, y=shares, marker_color='skyblue')])
 
-fig = px.bar(top_trends, x=keywords, y=shares, text_auto=True, color="post_count", title="Tendances Twitter")
+fig = px.bar(x=keywords, y=shares, text_auto=True, title="Tendances Twitter")
 
 
 # Set the title and labels
@@ -84,19 +122,10 @@ st.plotly_chart(fig)
 
 ########################hedha mazel ma5dmchhhh
 
-def get_top_keywords():
-    response = requests.get(f"{FASTAPI_URL}/api/top_keywords/score")
-    if response.status_code == 200:
-        return response.json().get("top_keywords", [])
-    else:
-        st.error(f"Failed to fetch data. Status Code: {response.status_code}")
-        return []
-    
-    
 st.write("Showing the top 10 trending keywords based on engagement metrics.")
 
-# Fetch top keywords
-top_keywords = get_top_keywords()
+# Top keywords by trending score, from the dashboard response
+top_keywords = dashboard.get("top_keywords_by_score", [])
 
 # Display data in a table and plot
 if top_keywords:
@@ -0,0 +1,78 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+# Root of the raw payload archive: <root>/<YYYY-MM-DD>/<source>.jsonl.gz
+ARCHIVE_DIR = os.getenv("ETL_ARCHIVE_DIR", "archive")
+
+_write_lock = threading.Lock()
+
+
+def archive_payloads(data, fetched_at=None, root=ARCHIVE_DIR):
+    """
+    Append raw API responses to the date-partitioned archive.
+    Each line holds the source name, its location/region scope (if any), the fetch time
+    and the untouched payload.
+    :param data: Dictionary of task key (source name, or (source name, scope)) to raw JSON response.
+    :param fetched_at: Fetch time (default: now, UTC).
+    :param root: Archive root directory.
+    :return: List of the files written to.
+    """
+    fetched_at = fetched_at or datetime.now(timezone.utc)
+    partition = os.path.join(root, fetched_at.strftime("%Y-%m-%d"))
+    os.makedirs(partition, exist_ok=True)
+    paths = []
+    with _write_lock:
+        for key, payload in data.items():
+            source, scope = key if isinstance(key, tuple) else (key, None)
+            path = os.path.join(partition, f"{source}.jsonl.gz")
+            entry = {"source": source, "scope": scope, "fetched_at": fetched_at.isoformat(), "payload": payload}
+            line = json.dumps(entry)
+            # Every append adds a gzip member; readers see the concatenation as one stream.
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.write(line + "\n")
+            paths.append(path)
+    return paths
+
+
+def list_partitions(root=ARCHIVE_DIR, sources=None, start=None, end=None):
+    """
+    List archive files per source, oldest first.
+    :param sources: Optional list of sources to keep.
+    :param start: Optional first date to include ("YYYY-MM-DD").
+    :param end: Optional last date to include ("YYYY-MM-DD").
+    :return: Dictionary of source name to list of file paths.
+    """
+    partitions = {}
+    if not os.path.isdir(root):
+        return partitions
+    for date in sorted(os.listdir(root)):
+        if (start and date < start) or (end and date > end):
+            continue
+        for filename in sorted(os.listdir(os.path.join(root, date))):
+            if not filename.endswith(".jsonl.gz"):
+                continue
+            source = filename[:-len(".jsonl.gz")]
+            if sources is None or source in sources:
+                partitions.setdefault(source, []).append(os.path.join(root, date, filename))
+    return partitions
+
+
+def read_archive(path):
+    """
+    Yield (source, scope, fetched_at, payload) for every response stored in an archive file.
+    A truncated last line, e.g. from an interrupted run, is skipped.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                fetched_at = datetime.fromisoformat(entry["fetched_at"])
+                yield entry["source"], entry.get("scope"), fetched_at, entry["payload"]
+        except EOFError:
+            return
@@ -0,0 +1,887 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Unreachable MongoDB: any data access during import fails fast instead of going unnoticed
+OFFLINE_MONGO_URI = "mongodb://127.0.0.1:9/?serverSelectionTimeoutMS=200"
+
+# Maximum median import time of the API module, in seconds
+STARTUP_BUDGET = float(os.getenv("BENCH_STARTUP_BUDGET", "1.5"))
+
+
+def bench_startup(module="api", runs=5):
+    """
+    Time a cold import of a module in fresh interpreters, with MongoDB unreachable.
+    :param module: Module to import.
+    :param runs: Number of interpreters to start.
+    :return: Dictionary with the min, median and max import time in seconds.
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    env = dict(os.environ, MONGO_URI=OFFLINE_MONGO_URI)
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return {"min": min(timings), "median": statistics.median(timings), "max": max(timings)}
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile (0-100) of a list of values, nearest-rank method.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_sync_app():
+    """
+    Build a baseline FastAPI app serving /api/top_keywords/score with a blocking
+    pymongo handler, as api.py did before the async data-access layer.
+    """
+    from fastapi import FastAPI
+    from db import get_database
+
+    app = FastAPI()
+    projection = {"_id": 0, "keyword": 1, "like": 1, "impression": 1, "share": 1, "trending_score": 1}
+
+    @app.get("/api/top_keywords/score")
+    def get_top_keywords_score(limit: int = 10):
+        collection = get_database()["trending_keywords_trends"]
+        return {"top_keywords": list(collection.find({}, projection).sort("trending_score", -1).limit(limit))}
+
+    return app
+
+
+async def load_test(app, path, concurrency=300, total=3000):
+    """
+    Send `total` GET requests to an ASGI app in-process, `concurrency` at a time.
+    :return: Dictionary with throughput and latency percentiles in milliseconds.
+    """
+    import httpx
+
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker(client):
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "rps": total / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def bench_load(path="/api/top_keywords/score", concurrency=300, total=3000):
+    """
+    Compare the blocking baseline handler with the async API against the MongoDB at MONGO_URI.
+    The response cache is disabled so that every request reaches the database.
+    """
+    import api
+
+    api.response_cache.max_size = 0
+    return {
+        "sync": asyncio.run(load_test(build_sync_app(), path, concurrency, total)),
+        "async": asyncio.run(load_test(api.app, path, concurrency, total)),
+    }
+
+
+def synthetic_google_trends(items, articles=10, seed=0):
+    """
+    Build a Google Trends response with `items` queries of `articles` articles each.
+    """
+    rng = random.Random(seed)
+    return {
+        "status": "success",
+        "items": [
+            {
+                "query": f"query {i}",
+                "formattedTraffic": f"{rng.randint(1, 999)}K+",
+                "relatedQueries": [f"related {i} {j}" for j in range(5)],
+                "image": {"newsUrl": f"https://news.example/{i}", "source": "Example", "imageUrl": f"https://img.example/{i}"},
+                "articles": [
+                    {
+                        "title": f"Article {i}-{j} " + "lorem ipsum " * 8,
+                        "timeAgo": f"{rng.randint(1, 23)}h ago",
+                        "source": "Example News",
+                        "image": {"newsUrl": f"https://news.example/{i}/{j}", "imageUrl": f"https://img.example/{i}/{j}"},
+                        "url": f"https://news.example/{i}/{j}",
+                        "snippet": "dolor sit amet " * 12,
+                    }
+                    for j in range(articles)
+                ],
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def synthetic_trending_hashtags(items, points=30, seed=0):
+    """
+    Build a TikTok trending hashtags response with `items` hashtags of `points` trend points each.
+    """
+    rng = random.Random(seed)
+    return {
+        "code": 0,
+        "data": {
+            "list": [
+                {
+                    "hashtag_id": str(i),
+                    "hashtag_name": f"hashtag{i}",
+                    "country_info": {"id": "US", "value": "United States"},
+                    "is_promoted": False,
+                    "trend": [{"time": 1700000000 + 86400 * t, "value": rng.random()} for t in range(points)],
+                    "creators": [{"nick_name": f"creator{i}-{c}", "avatar_url": f"https://img.example/{i}/{c}"} for c in range(3)],
+                    "publish_cnt": rng.randint(0, 10 ** 6),
+                    "video_views": rng.randint(0, 10 ** 9),
+                    "rank": i + 1,
+                    "rank_diff": rng.randint(-50, 50),
+                    "rank_diff_type": rng.randint(0, 3),
+                }
+                for i in range(items)
+            ]
+        },
+    }
+
+
+def synthetic_trending_keywords(items, seed=0):
+    """
+    Build a TikTok trending keywords page with `items` keywords, some with missing or string-typed counts.
+    """
+    rng = random.Random(seed)
+    keywords = []
+    for i in range(items):
+        keyword = {
+            "keyword": f"keyword {i}",
+            "comment": rng.randint(0, 10 ** 5),
+            "cost": rng.random() * 1000,
+            "cpa": rng.random() * 50,
+            "ctr": rng.random(),
+            "cvr": rng.random(),
+            "impression": rng.randint(0, 10 ** 8),
+            "like": rng.randint(0, 10 ** 6),
+            "play_six_rate": rng.random(),
+            "post": rng.randint(0, 10 ** 4),
+            "post_change": rng.uniform(-1, 1),
+            "share": str(rng.randint(0, 10 ** 5)),
+            "video_list": [str(rng.randint(10 ** 18, 10 ** 19)) for _ in range(3)],
+        }
+        if i % 10 == 0:
+            del keyword["like"]
+        keywords.append(keyword)
+    return {"code": 0, "data": {"keyword_list": keywords}}
+
+
+def synthetic_trending_ads(items, seed=0):
+    """
+    Build a TikTok top ads page with `items` ads.
+    """
+    rng = random.Random(seed)
+    return {
+        "code": 0,
+        "data": {
+            "materials": [
+                {
+                    "ad_title": f"Ad {i}",
+                    "brand_name": f"Brand {i % 100}",
+                    "cost": rng.randint(1, 3),
+                    "ctr": rng.random(),
+                    "favorite": False,
+                    "id": str(10 ** 15 + i),
+                    "industry_key": "label_22000000000",
+                    "is_search": rng.random() < 0.5,
+                    "like": rng.randint(0, 10 ** 6),
+                    "objective_key": "campaign_objective_conversion",
+                    "video_info": {
+                        "vid": f"v{i}",
+                        "duration": rng.uniform(5, 60),
+                        "cover": f"https://img.example/{i}",
+                        "video_url": {"720p": f"https://video.example/{i}/720p"},
+                        "width": 720,
+                        "height": 1280,
+                    },
+                }
+                for i in range(items)
+            ]
+        },
+    }
+
+
+def synthetic_twitter_trends(items, seed=0):
+    """
+    Build a Twitter trends response with `items` trends, post counts given as text ("12,345 posts").
+    Trend names match the synthetic keywords, so that entities span several platforms.
+    """
+    rng = random.Random(seed)
+    trends = []
+    for i in range(items):
+        trend = {
+            "name": f"#keyword{i}",
+            "postCount": f"{rng.randint(1000, 10 ** 6):,} posts",
+            "domain": rng.choice(["Sports", "Politics", "Entertainment", "Technology"]),
+            "rank": i + 1,
+            "mobileIntent": f"twitter://search?query=%23keyword{i}",
+            "webUrl": f"https://twitter.example/search?q=%23keyword{i}",
+        }
+        if i % 10 == 0:
+            del trend["postCount"]
+        trends.append(trend)
+    return {"status": "SUCCESS", "trending": {"trends": trends}}
+
+
+def synthetic_twitter_locations(items, seed=0):
+    """
+    Build a Twitter locations response with `items` locations.
+    """
+    rng = random.Random(seed)
+    return {
+        "status": "SUCCESS",
+        "locations": [
+            {"name": f"Location {i}", "placeID": str(10 ** 6 + i), "locationType": rng.choice(["Country", "Town"])}
+            for i in range(items)
+        ],
+    }
+
+
+def synthetic_twitter_hashtags(items, seed=0):
+    """
+    Build a Twitter hashtags response with `items` hashtags, some without a tweet volume.
+    """
+    rng = random.Random(seed)
+    return {
+        "success": True,
+        "data": [
+            {
+                "name": f"#hashtag{i}",
+                "url": f"https://twitter.example/hashtag/hashtag{i}",
+                "tweet_volume": rng.randint(1000, 10 ** 6) if i % 10 else None,
+                "agencyDataUpdateTime": "2024-01-01T00:00:00Z",
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def synthetic_tiktok_tags(items, seed=0):
+    """
+    Build a TikTok tag generator response with `items` hashtags in each category.
+    """
+    rng = random.Random(seed)
+
+    def tags(category):
+        return [f"#{category}{i}" for i in range(items)]
+
+    combinations = tags("combo")
+    return {
+        "status": "success",
+        "result": {
+            "hashtags": {category: tags(category) for category in ("trending", "niche", "viral", "community", "recommended")},
+            "trends": {"currentTrends": tags("current"), "risingTrends": tags("rising"), "challengeTags": tags("challenge")},
+            "strategy": {
+                "bestPractices": ["Post consistently"] * 5,
+                "combinations": [combinations[i:i + 3] for i in range(0, items, 3)],
+                "timing": "Evenings",
+            },
+            "metrics": {
+                "trendingScore": f"{rng.randint(0, 100)}",
+                "viralPotential": "High",
+                "reachEstimate": f"{rng.randint(1, 999)}K",
+                "competitionLevel": "Medium",
+            },
+        },
+    }
+
+
+def synthetic_youtube_videos(items, seed=0):
+    """
+    Build a YouTube trending response with `items` videos, view counts given as strings.
+    """
+    rng = random.Random(seed)
+    return {
+        "data": [
+            {
+                "videoId": f"video{i:07d}",
+                "title": f"Video {i} " + "lorem ipsum " * 4,
+                "channelTitle": f"Channel {i % 500}",
+                "channelId": f"UC{i % 500:022d}",
+                "channelHandle": f"@channel{i % 500}",
+                "channelThumbnail": [{"url": f"https://img.example/channel/{i % 500}", "width": 68, "height": 68}],
+                "description": "dolor sit amet " * 10,
+                "viewCount": str(rng.randint(0, 10 ** 8)),
+                "publishedTimeText": f"{rng.randint(1, 23)} hours ago",
+                "publishDate": "2024-01-01",
+                "lengthText": f"{rng.randint(1, 59)}:{rng.randint(0, 59):02d}",
+                "thumbnail": [
+                    {"url": f"https://img.example/video/{i}/{size}", "width": size, "height": size * 9 // 16}
+                    for size in (168, 336)
+                ],
+            }
+            for i in range(items)
+        ]
+    }
+
+
+def synthetic_google_regions(items, seed=0):
+    """
+    Build a Google Trends regions response with `items` regions, named differently for each seed.
+    """
+    rng = random.Random(seed)
+    return {
+        "status": "success",
+        "regions": [{"code": f"R{i}", "name": f"Region {i}-{rng.randint(0, 10 ** 6)}"} for i in range(items)],
+    }
+
+
+# Synthetic payload generator and transform of every source, in the order of etl_pipeline.TRANSFORMS
+SYNTHETIC_SOURCES = {
+    "tweeter": (synthetic_twitter_trends, "transform_twitter_trends_data"),
+    "location": (synthetic_twitter_locations, "transform_twitter_locations_data"),
+    "hashtag": (synthetic_twitter_hashtags, "transform_twitter_hashtags_data"),
+    "tiktok": (synthetic_tiktok_tags, "transform_tiktok_tags_records"),
+    "trending_keywords": (synthetic_trending_keywords, "transform_trending_keywords_data"),
+    "trending_ads": (synthetic_trending_ads, "transform_trending_ads_data"),
+    "trending_hashtags": (synthetic_trending_hashtags, "transform_trending_hashtags_data"),
+    "youtube": (synthetic_youtube_videos, "transform_youtube_videos_data"),
+    "google_trends": (synthetic_google_trends, "transform_google_trends_data"),
+    "google_regions": (synthetic_google_regions, "transform_google_regions_data"),
+}
+
+
+# Synthetic payload generator and per-dict transform of the sources handled by the columnar engine
+COLUMNAR_SOURCES = {
+    "trending_keywords": (synthetic_trending_keywords, "transform_trending_keywords_data"),
+    "trending_ads": (synthetic_trending_ads, "transform_trending_ads_data"),
+}
+
+
+def _best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_columnar(sizes=(10000, 100000, 1000000), repeat=3):
+    """
+    Compare the per-dict transforms with the columnar engine, both for the transform alone
+    and up to ingest-ready row dictionaries.
+    :param sizes: Numbers of records per payload.
+    :param repeat: Runs per measurement; the best one is kept.
+    :return: Dictionary of source name to a list of per-size results in records per second.
+    """
+    import columnar
+    import transform_data
+
+    results = {}
+    for source, (generate, transform_name) in COLUMNAR_SOURCES.items():
+        transform = getattr(transform_data, transform_name)
+        results[source] = []
+        for size in sizes:
+            payload = generate(size)
+            per_dict = _best_time(lambda: transform(payload), repeat)
+            columns = _best_time(lambda: columnar.transform_columns(payload, source), repeat)
+            rows = _best_time(lambda: list(columnar.transform_columns(payload, source).records()), repeat)
+            results[source].append({
+                "records": size,
+                "per_dict_rps": size / per_dict,
+                "columnar_rps": size / columns,
+                "columnar_rows_rps": size / rows,
+            })
+    return results
+
+
+# Raw numeric values the record models accept: all readable by float() (the columnar fast path),
+# and the same with display counts, text and containers (its slow path)
+PLAIN_NUMBERS = (12, 1.6, 2.5, True, "1e3", "1.5e6", " 42 ", "nan", float("inf"), 2 ** 60 + 1, None)
+MIXED_NUMBERS = PLAIN_NUMBERS + ("20K+", "12,345 posts", "1.2M views", "abc", [1])
+
+
+def check_columnar(items=1000, seed=0):
+    """
+    Run the per-dict transforms and the columnar engine on the same payloads, whose numeric fields
+    mix the values of PLAIN_NUMBERS or MIXED_NUMBERS.
+    :return: Dictionary of source name to whether both paths gave identical records for every mix.
+    """
+    import columnar
+    import transform_data
+
+    rng = random.Random(seed)
+    results = {}
+    for source, (generate, transform_name) in COLUMNAR_SOURCES.items():
+        transform = getattr(transform_data, transform_name)
+        results[source] = True
+        for numbers in (PLAIN_NUMBERS, MIXED_NUMBERS):
+            payload = generate(items, seed)
+            for item in columnar.raw_items(payload, source):
+                for _, path, kind, _ in columnar.COLUMN_SPECS[source]:
+                    if kind in ("int", "float"):
+                        parent = item
+                        for key in path[:-1]:
+                            parent = parent[key]
+                        parent[path[-1]] = rng.choice(numbers)
+            columns = list(columnar.transform_columns(payload, source).records())
+            results[source] = results[source] and columns == transform(payload)
+    return results
+
+
+# Synthetic payload generator and list-returning transform of the sources with large nested responses
+MEMORY_SOURCES = {
+    "google_trends": (synthetic_google_trends, "transform_google_trends_data"),
+    "trending_hashtags": (synthetic_trending_hashtags, "transform_trending_hashtags_data"),
+}
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(items=20000, batch_size=500):
+    """
+    Compare the peak memory of decoding a response whole and transforming it into a list
+    with streaming it through iter_stream_records in ingest-sized batches.
+    The raw response bytes exist before measurement in both cases.
+    :return: Dictionary of source name to payload size and peak memory (bytes) per path.
+    """
+    import transform_data
+
+    results = {}
+    for source, (generate, transform_name) in MEMORY_SOURCES.items():
+        raw = json.dumps(generate(items)).encode("utf-8")
+        transform = getattr(transform_data, transform_name)
+
+        def decode_whole():
+            records = transform(json.loads(raw))
+            return len(records)
+
+        def stream_batches():
+            batch = []
+            for record in transform_data.iter_stream_records(io.BytesIO(raw), source):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    batch = []
+
+        results[source] = {
+            "payload_bytes": len(raw),
+            "list_peak_bytes": _peak_memory(decode_whole),
+            "stream_peak_bytes": _peak_memory(stream_batches),
+        }
+    return results
+
+
+def bench_rising(entities=100000, points=96, k=20, repeat=3, seed=0):
+    """
+    Time rank_rising on random-walk series, a few of which break out on their last point.
+    Series are ranked over RISING_LOOKBACK points, as /api/rising does.
+    :return: Dictionary with the best time in seconds and whether every planted breakout ranked in the top k.
+    """
+    import numpy as np
+    from analytics import RISING_LOOKBACK, rank_rising
+
+    rng = np.random.default_rng(seed)
+    values = 1000 + rng.normal(0, 10, (entities, points)).cumsum(axis=1)
+    planted = rng.choice(entities, size=min(k, entities) // 2, replace=False)
+    values[planted, -1] += 500
+    lengths = rng.integers(points // 2, points + 1, entities)
+    # Lists, as the API gets them from MongoDB
+    series = [row[points - length:].tolist() for row, length in zip(values, lengths)]
+    keys = [f"entity{i}" for i in range(entities)]
+
+    ranked = []
+    seconds = _best_time(lambda: ranked.append(rank_rising(keys, series, "breakout", k, lookback=RISING_LOOKBACK)), repeat)
+    found = {result["key"] for result in ranked[-1]}
+    return {"entities": entities, "seconds": seconds, "planted_found": all(f"entity{i}" in found for i in planted)}
+
+
+def bench_search(entities=100000, queries=1000, limit=10, repeat=3, seed=0):
+    """
+    Time SearchIndex.search on random entities, and check its ranking on planted entities:
+    a key on more platforms must come before a lighter one sorting earlier, whether the prefix
+    matches fewer entities than the limit or many more.
+    :return: Dictionary with the best time per query in seconds and whether the planted entities ranked first.
+    """
+    from search_index import SEARCH_SOURCES, SearchIndex
+
+    rng = random.Random(seed)
+    sources = list(SEARCH_SOURCES)
+    index = SearchIndex()
+    for i in range(entities):
+        key = "".join(rng.choice("abcdefghij") for _ in range(6)) + str(i)
+        index._entities[key] = {source: {i: {}} for source in rng.sample(sources, rng.randint(1, 3))}
+    # "zzza" and "zzzb" are the only keys under "zzz"; "j" prefixes about a tenth of the entities
+    planted = {"zzza": sources[:1], "zzzb": sources[:2], "jjjjjj": sources}
+    for i, (key, platforms) in enumerate(planted.items()):
+        index._entities[key] = {source: {-1 - i: {}} for source in platforms}
+    index._update_arrays(set(index._entities))
+
+    prefixes = ["".join(rng.choice("abcdefghij") for _ in range(rng.randint(1, 3))) for _ in range(queries)]
+    seconds = _best_time(lambda: [index.search(prefix, limit) for prefix in prefixes], repeat)
+    ranked = index.search("zzz", limit)[0]["key"] == "zzzb" and index.search("j", limit)[0]["key"] == "jjjjjj"
+    return {"entities": entities, "seconds": seconds / queries, "planted_ranked_first": ranked}
+
+
+## Suite :
+# Transform, ingest and API benchmarks on seeded synthetic payloads, written as JSON so that
+# runs can be compared: a run fails when a benchmark is slower than its baseline by more than the threshold.
+
+# Database the suite ingests into and serves from; it is dropped at the start of every run
+BENCH_DB = os.getenv("BENCH_MONGO_DB", "trends_bench")
+
+# Slowdown tolerated against the baseline before a benchmark counts as a regression (0.25 = 25%)
+REGRESSION_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25"))
+
+# Compared metric of each benchmark kind, and whether higher is better
+REGRESSION_METRICS = {"rps": True, "p95": False}
+
+# Run settings that must match for two suite results to be comparable
+COMPARABLE_SETTINGS = ("backend", "size", "repeat", "concurrency", "requests")
+
+# Scope stored with the records of scoped sources (location, region)
+BENCH_SCOPE = "bench"
+
+# Endpoints timed by the suite, against the synthetic data
+API_ENDPOINTS = (
+    "/api/trends?limit=100",
+    "/api/top_keywords",
+    "/api/top_keywords/score",
+    "/api/dashboard",
+    "/api/search?q=key",
+    "/api/entity/keyword1",
+)
+
+SUITE_STAGES = ("transforms", "ingest", "api")
+
+
+def bench_transforms(size=10000, repeat=3):
+    """
+    Time every transform_* function, and the columnar engine where it applies, on synthetic payloads.
+    :return: Dictionary of benchmark name to records, best time in seconds and records per second.
+    """
+    import columnar
+    import transform_data
+
+    results = {}
+    for source, (generate, transform_name) in SYNTHETIC_SOURCES.items():
+        payload = generate(size)
+        transform = getattr(transform_data, transform_name)
+        # Records produced, not payload items: the tiktok payload makes a single record
+        records = len(transform(payload))
+        seconds = _best_time(lambda: transform(payload), repeat)
+        results[f"transform.{source}"] = {"records": records, "seconds": seconds, "rps": records / seconds}
+        if source in columnar.COLUMN_SPECS:
+            seconds = _best_time(lambda: columnar.transform_columns(payload, source), repeat)
+            results[f"columnar.{source}"] = {"records": records, "seconds": seconds, "rps": records / seconds}
+    return results
+
+
+def open_bench_database(backend):
+    """
+    Return the benchmark database: BENCH_DB on the MongoDB at MONGO_URI, or an in-memory
+    mongomock database (an optional dependency, not needed by the project itself).
+    :return: (database, None), or (None, reason) if the memory backend is unavailable.
+    """
+    if backend == "memory":
+        from pymongo import UpdateOne, version
+
+        try:
+            import mongomock
+
+            database = mongomock.MongoClient()[BENCH_DB]
+            # Ingest writes bulk UpdateOne upserts, which some mongomock releases reject with recent pymongo
+            database["probe"].bulk_write([UpdateOne({"_id": 0}, {"$set": {"ok": 1}}, upsert=True)])
+            database.drop_collection("probe")
+        except ImportError:
+            return None, "mongomock is not installed (pip install mongomock)"
+        except (TypeError, NotImplementedError) as e:
+            return None, f"mongomock cannot run bulk upserts with pymongo {version}: {e!r}"
+        return database, None
+    from db import get_database
+
+    return get_database(), None
+
+
+def bench_ingest(database, size=10000):
+    """
+    Ingest synthetic payloads into an emptied database through etl_pipeline.ingest, three times
+    per source: into empty collections, unchanged (every record skipped), then with new values.
+    :return: Dictionary of benchmark name to records, time in seconds and records per second.
+    """
+    import etl_pipeline
+    from registry import ensure_indexes, get_collections
+
+    # ingest() writes through the module's collections
+    etl_pipeline.db = database
+    etl_pipeline.collections = get_collections(database)
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    ensure_indexes(database)
+
+    results = {}
+    for source, (generate, transform_name) in SYNTHETIC_SOURCES.items():
+        key = (source, BENCH_SCOPE) if source in etl_pipeline.SCOPED_SOURCES else source
+        for run, seed in (("insert", 0), ("unchanged", 0), ("update", 1)):
+            payload = generate(size, seed=seed)
+            records = len(etl_pipeline.TRANSFORMS[source](payload))
+            start = time.perf_counter()
+            etl_pipeline.ingest({key: payload})
+            seconds = time.perf_counter() - start
+            results[f"ingest.{source}.{run}"] = {"records": records, "seconds": seconds, "rps": records / seconds}
+    return results
+
+
+def bench_api(concurrency=50, total=1000, endpoints=API_ENDPOINTS):
+    """
+    Time the API endpoints in-process against the data left by bench_ingest, on the MongoDB at MONGO_URI.
+    The response cache is disabled so that every request runs its handler.
+    :return: Dictionary of benchmark name to throughput and latency percentiles in milliseconds.
+    """
+    import api
+    from db import get_database
+
+    api.response_cache.max_size = 0
+    api.search_index.refresh(get_database())
+    return {f"api.{path}": asyncio.run(load_test(api.app, path, concurrency, total)) for path in endpoints}
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def run_suite(stages=SUITE_STAGES, size=10000, repeat=3, backend="mongod", concurrency=50, total=1000):
+    """
+    Run the suite stages and return the results with the context needed to compare runs.
+    The API stage needs MongoDB (the API client is asyncio-only) and is skipped on the memory backend;
+    the ingest stage is skipped too if mongomock is missing or incompatible with the installed pymongo.
+    :return: Dictionary with "meta" (run settings and environment) and "benchmarks" (name -> result).
+    """
+    import platform
+
+    # Every module must resolve DB_NAME to the benchmark database: set it before any of them is imported
+    os.environ["MONGO_DB"] = BENCH_DB
+    from registry import DB_NAME
+
+    if DB_NAME != BENCH_DB:
+        raise RuntimeError(f"registry was imported before the suite; refusing to write into '{DB_NAME}'")
+
+    benchmarks = {}
+    skipped = {}
+    if "transforms" in stages:
+        benchmarks.update(bench_transforms(size, repeat))
+    if "ingest" in stages or "api" in stages:
+        database, reason = open_bench_database(backend)
+        if database is not None:
+            benchmarks.update(bench_ingest(database, size))
+        else:
+            skipped.update(dict.fromkeys([name for name in ("ingest", "api") if name in stages], reason))
+    if "api" in stages and "api" not in skipped:
+        if backend == "mongod":
+            benchmarks.update(bench_api(concurrency, total))
+        else:
+            skipped["api"] = "needs the mongod backend"
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "size": size,
+            "repeat": repeat,
+            "concurrency": concurrency,
+            "requests": total,
+            "stages": [name for name in stages if name not in skipped],
+            "skipped": skipped,
+        },
+        "benchmarks": benchmarks,
+    }
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare two suite results benchmark by benchmark, on the REGRESSION_METRICS they both hold.
+    Benchmarks missing from either run are ignored.
+    :return: List of regressions, as dictionaries with the benchmark, metric, both values and the slowdown.
+    :raises ValueError: If the runs used different COMPARABLE_SETTINGS.
+    """
+    different = [name for name in COMPARABLE_SETTINGS if baseline["meta"].get(name) != current["meta"].get(name)]
+    if different:
+        raise ValueError(f"Baseline run with different settings: {', '.join(different)}")
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or not new:
+                continue
+            slowdown = old / new - 1 if higher_is_better else new / old - 1
+            if slowdown > threshold:
+                regressions.append({"benchmark": name, "metric": metric, "baseline": old, "current": new,
+                                    "slowdown": slowdown})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the trends project.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="Cold import time of the FastAPI module.")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET)
+
+    load = subparsers.add_parser("load", help="p99 latency of blocking vs async Mongo handlers (needs a local mongod).")
+    load.add_argument("--path", default="/api/top_keywords/score")
+    load.add_argument("--concurrency", type=int, default=300)
+    load.add_argument("--requests", type=int, default=3000)
+
+    memory = subparsers.add_parser("memory", help="Peak memory of list vs streaming transforms on large payloads.")
+    memory.add_argument("--items", type=int, default=20000)
+    memory.add_argument("--batch-size", type=int, default=500)
+
+    columns = subparsers.add_parser("columnar", help="Throughput of per-dict vs columnar transforms.")
+    columns.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    columns.add_argument("--repeat", type=int, default=3)
+
+    rising = subparsers.add_parser("rising", help="Time to rank entities by trend breakout.")
+    rising.add_argument("--entities", type=int, default=100000)
+    rising.add_argument("--points", type=int, default=96, help="Points per series (before random truncation).")
+
+    search = subparsers.add_parser("search", help="Autocomplete time and ranking of the search index.")
+    search.add_argument("--entities", type=int, default=100000)
+    search.add_argument("--queries", type=int, default=1000)
+
+    suite = subparsers.add_parser(
+        "suite", help="Transform, ingest and API benchmarks on synthetic payloads, as JSON, checked against a baseline."
+    )
+    suite.add_argument("--stages", nargs="+", choices=SUITE_STAGES, default=list(SUITE_STAGES))
+    suite.add_argument("--size", type=int, default=10000, help="Records per synthetic payload.")
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--backend", choices=["mongod", "memory"], default="mongod",
+                       help="Ingest into BENCH_MONGO_DB at MONGO_URI, or into mongomock (no API stage).")
+    suite.add_argument("--concurrency", type=int, default=50)
+    suite.add_argument("--requests", type=int, default=1000, help="Requests per API endpoint.")
+    suite.add_argument("--output", help="Write the results to this JSON file.")
+    suite.add_argument("--baseline", help="Results of an earlier run to check for regressions.")
+    suite.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        timings = bench_startup(runs=args.runs)
+        print(f"api import: min {timings['min']:.3f}s, median {timings['median']:.3f}s, max {timings['max']:.3f}s")
+        if timings["median"] > args.budget:
+            print(f"FAIL: median import time exceeds the {args.budget:.2f}s budget")
+            return 1
+    elif args.command == "load":
+        results = bench_load(args.path, args.concurrency, args.requests)
+        for name, result in results.items():
+            print(
+                f"{name:>5}: {result['rps']:.0f} req/s, p50 {result['p50']:.1f}ms, "
+                f"p95 {result['p95']:.1f}ms, p99 {result['p99']:.1f}ms"
+            )
+    elif args.command == "memory":
+        mb = 1024 * 1024
+        for source, result in bench_memory(args.items, args.batch_size).items():
+            print(
+                f"{source}: payload {result['payload_bytes'] / mb:.1f} MiB, "
+                f"list peak {result['list_peak_bytes'] / mb:.1f} MiB, "
+                f"stream peak {result['stream_peak_bytes'] / mb:.1f} MiB"
+            )
+    elif args.command == "columnar":
+        for source, identical in check_columnar().items():
+            print(f"{source}: columnar records identical to per-dict ones on mixed values: {identical}")
+        for source, results in bench_columnar(args.sizes, args.repeat).items():
+            for result in results:
+                print(
+                    f"{source} x{result['records']}: per-dict {result['per_dict_rps']:,.0f} rec/s, "
+                    f"columnar {result['columnar_rps']:,.0f} rec/s, "
+                    f"columnar + rows {result['columnar_rows_rps']:,.0f} rec/s"
+                )
+    elif args.command == "rising":
+        result = bench_rising(args.entities, args.points)
+        print(
+            f"rank_rising x{result['entities']}: {result['seconds'] * 1000:.0f}ms, "
+            f"planted breakouts found: {result['planted_found']}"
+        )
+    elif args.command == "search":
+        result = bench_search(args.entities, args.queries)
+        print(
+            f"search x{result['entities']}: {result['seconds'] * 1e6:.0f}us per query, "
+            f"planted entities ranked first: {result['planted_ranked_first']}"
+        )
+    elif args.command == "suite":
+        results = run_suite(args.stages, args.size, args.repeat, args.backend, args.concurrency, args.requests)
+        for name, result in results["benchmarks"].items():
+            latency = f", p95 {result['p95']:.1f}ms" if "p95" in result else ""
+            print(f"{name:<40} {result['rps']:>14,.0f} /s{latency}")
+        for name, reason in results["meta"]["skipped"].items():
+            print(f"Skipped: {name} ({reason})")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+            print(f"Results written to {args.output}")
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+            try:
+                regressions = compare_results(baseline, results, args.threshold)
+            except ValueError as e:
+                print(f"FAIL: {e}")
+                return 1
+            for regression in regressions:
+                print(
+                    f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+                    f"{regression['baseline']:,.1f} -> {regression['current']:,.1f} "
+                    f"({regression['slowdown']:.0%} slower)"
+                )
+            if regressions:
+                print(f"FAIL: {len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
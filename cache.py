@@ -0,0 +1,145 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from registry import COLLECTIONS, META_COLLECTION
+
+# Document of META_COLLECTION holding the ETL generation counter
+GENERATION_ID = "etl_generation"
+
+# Maximum number of cached responses
+CACHE_MAX_SIZE = int(os.getenv("API_CACHE_MAX_SIZE", "512"))
+
+# How often (seconds) the API re-reads the ETL generation from MongoDB
+GENERATION_POLL_SECONDS = float(os.getenv("API_GENERATION_POLL_SECONDS", "1"))
+
+
+async def read_generations(db):
+    """
+    Read the current ETL generation and the generation of every source.
+    :param db: Asyncio MongoDB database.
+    :return: (generation number, dictionary of source name to its generation), (0, {}) if no ETL run has completed yet.
+    """
+    doc = await db[META_COLLECTION].find_one({"_id": GENERATION_ID}, {"value": 1, "sources": 1})
+    return (doc.get("value", 0), doc.get("sources", {})) if doc else (0, {})
+
+
+def bump_generation(db, sources=None):
+    """
+    Mark the end of an ETL run so that the cached API responses built on its sources are invalidated.
+    :param db: MongoDB database.
+    :param sources: Source names the run wrote (default: every source).
+    :return: New generation number.
+    """
+    names = COLLECTIONS if sources is None else sources
+    increments = dict({f"sources.{name}": 1 for name in names}, value=1)
+    doc = db[META_COLLECTION].find_one_and_update(
+        {"_id": GENERATION_ID},
+        {"$inc": increments, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=True
+    )
+    return doc["value"]
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of API responses, keyed by endpoint, parameters and the generation
+    of the sources the endpoint reads, so that a run of one source keeps the other responses.
+    """
+
+    def __init__(self, generation, max_size=CACHE_MAX_SIZE, poll_interval=GENERATION_POLL_SECONDS):
+        """
+        :param generation: Coroutine function returning the current ETL generation and per-source generations.
+        :param max_size: Maximum number of cached responses.
+        :param poll_interval: Minimum delay in seconds between two generation reads.
+        """
+        self._read_generation = generation
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._sources = {}
+        self._checked_at = 0.0
+
+    async def generation(self):
+        """
+        Return the ETL generation, re-read at most every poll_interval seconds.
+        Entries built on an older generation of their sources are dropped as soon as a new one is seen.
+        """
+        now = time.monotonic()
+        if self._generation is None or now - self._checked_at >= self.poll_interval:
+            generation, sources = await self._read_generation()
+            with self._lock:
+                if (generation, sources) != (self._generation, self._sources):
+                    self._generation, self._sources = generation, sources
+                    for key in [key for key in self._entries if not self._is_current(key[-1])]:
+                        del self._entries[key]
+                self._checked_at = now
+        return self._generation
+
+    def _version(self, name):
+        # "*" stands for every source: the global generation
+        return self._generation if name == "*" else self._sources.get(name, 0)
+
+    def _is_current(self, versions):
+        return all(self._version(name) == version for name, version in versions)
+
+    def _versions(self, names):
+        with self._lock:
+            return tuple((name, self._version(name)) for name in (("*",) if names is None else names))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "generation": self._generation,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def cached(self, func=None, sources=None):
+        """
+        Decorator caching an async handler's result per keyword arguments and generation of the sources it reads:
+        `@cache.cached` (every source) or `@cache.cached(sources=("tweeter",))`.
+        :param sources: Source names, or function of the keyword arguments returning them.
+        """
+        if func is None:
+            return functools.partial(self.cached, sources=sources)
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            await self.generation()
+            names = sources(kwargs) if callable(sources) else sources
+            key = (func.__name__, tuple(sorted(kwargs.items())), self._versions(names))
+            found, value = self.get(key)
+            if not found:
+                value = await func(**kwargs)
+                self.put(key, value)
+            return value
+        return wrapper
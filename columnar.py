@@ -0,0 +1,187 @@
+import numpy as np
+
+from models import joined, to_bool, to_float, to_int
+from transform_data import STREAM_SPECS, TRENDING_SCORE_WEIGHTS
+
+## Column specs :
+# Per source: (output field, key path in the raw item, kind, default) for every column, matching
+# the field types of the record models in models.py.
+# Kinds: "int" and "float" become NumPy arrays with missing/invalid values set to the default,
+# "bool" a NumPy boolean array, "str" a list of strings, "join" a list of "; "-joined strings.
+COLUMN_SPECS = {
+    "trending_keywords": [
+        ("keyword", ("keyword",), "str", ""),
+        ("comment", ("comment",), "int", 0),
+        ("cost", ("cost",), "float", 0),
+        ("cpa", ("cpa",), "float", 0),
+        ("ctr", ("ctr",), "float", 0),
+        ("cvr", ("cvr",), "float", 0),
+        ("impression", ("impression",), "int", 0),
+        ("like", ("like",), "int", 0),
+        ("play_six_rate", ("play_six_rate",), "float", 0),
+        ("post", ("post",), "int", 0),
+        ("post_change", ("post_change",), "float", 0),
+        ("share", ("share",), "int", 0),
+        ("video_list", ("video_list",), "join", ""),
+    ],
+    "trending_ads": [
+        ("ad_title", ("ad_title",), "str", ""),
+        ("brand_name", ("brand_name",), "str", ""),
+        ("cost", ("cost",), "float", 0),
+        ("ctr", ("ctr",), "float", 0),
+        ("favorite", ("favorite",), "bool", False),
+        ("id", ("id",), "str", ""),
+        ("industry_key", ("industry_key",), "str", ""),
+        ("is_search", ("is_search",), "bool", False),
+        ("like", ("like",), "int", 0),
+        ("objective_key", ("objective_key",), "str", ""),
+        ("video_id", ("video_info", "vid"), "str", ""),
+        ("video_duration", ("video_info", "duration"), "float", 0),
+        ("video_cover", ("video_info", "cover"), "str", ""),
+        ("video_url_720p", ("video_info", "video_url", "720p"), "str", ""),
+        ("video_width", ("video_info", "width"), "int", 0),
+        ("video_height", ("video_info", "height"), "int", 0),
+    ],
+}
+
+# Weighted score columns computed after the transform: source -> (output field, weights)
+COLUMN_SCORES = {
+    "trending_keywords": ("trending_score", TRENDING_SCORE_WEIGHTS),
+}
+
+
+class ColumnBatch:
+    """
+    A batch of records stored column by column.
+    Numeric and boolean columns are NumPy arrays, the others plain lists.
+    """
+
+    def __init__(self, columns=None, length=0):
+        self._columns = dict(columns or {})
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    @property
+    def fields(self):
+        return list(self._columns)
+
+    def add(self, name, values):
+        """
+        Add or replace a column; a scalar is repeated on every row.
+        """
+        if np.isscalar(values) or values is None:
+            values = [values] * self._length
+        elif len(values) != self._length:
+            raise ValueError(f"Column '{name}' has {len(values)} values for {self._length} rows")
+        self._columns[name] = values
+
+    def records(self):
+        """
+        Yield the rows as dictionaries of plain Python values, ready to be stored in MongoDB.
+        """
+        names = list(self._columns)
+        values = [column.tolist() if isinstance(column, np.ndarray) else column for column in self._columns.values()]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+
+def raw_items(payload, source):
+    """
+    Return the list of raw items of a response, or an empty list if the API reported a failure.
+    The item location and success flag are those used by the streaming transform.
+    """
+    prefix, status_key, is_success, _ = STREAM_SPECS[source]
+    if status_key and not is_success(payload.get(status_key)):
+        return []
+    items = payload
+    for key in prefix.split(".")[:-1]:
+        items = (items or {}).get(key)
+    return items or []
+
+
+def _extract(items, path, default, parents):
+    """
+    Return the value at `path` of every item; nested dictionaries are looked up once per
+    path prefix and kept in `parents` for the next columns sharing it.
+    """
+    if len(path) > 1:
+        prefix = path[:-1]
+        if prefix not in parents:
+            outer = _extract(items, prefix, None, parents)
+            parents[prefix] = [value if isinstance(value, dict) else {} for value in outer]
+        items = parents[prefix]
+    key = path[-1]
+    return [item.get(key, default) for item in items]
+
+
+def _numeric_column(values, default, dtype):
+    """
+    Coerce a list of raw values to a NumPy array, replacing missing or invalid values with the default.
+    Values are coerced as by to_float / to_int.
+    """
+    try:
+        column = np.array(values, dtype=np.float64)
+        if column.ndim != 1:
+            raise ValueError("nested values")
+        if dtype is not np.float64 and np.abs(column[np.isfinite(column)]).max(initial=0) >= 2 ** 53:
+            raise ValueError("integers beyond float64 precision")
+    except (TypeError, ValueError):
+        # Slow path for batches holding display counts ("20K+"), other strings, containers or large integers
+        if dtype is not np.float64:
+            return np.fromiter((to_int(value, default) for value in values), dtype=dtype, count=len(values))
+        column = np.fromiter((to_float(value, np.nan) for value in values), dtype=np.float64, count=len(values))
+    column[~np.isfinite(column)] = default
+    return np.rint(column).astype(dtype) if dtype is not np.float64 else column
+
+
+def _column(values, kind, default):
+    if kind == "int":
+        return _numeric_column(values, default, np.int64)
+    if kind == "float":
+        return _numeric_column(values, default, np.float64)
+    if kind == "bool":
+        return np.array([to_bool(value, default) for value in values], dtype=bool)
+    if kind == "join":
+        return [joined(value) for value in values]
+    if set(map(type, values)) <= {str}:
+        return values
+    return [value if isinstance(value, str) else default if value is None else str(value) for value in values]
+
+
+def score_columns(batch, field, weights=TRENDING_SCORE_WEIGHTS):
+    """
+    Add the weighted sum of numeric columns to a batch, computed on whole columns at once.
+    :param batch: ColumnBatch holding every weighted column.
+    :param field: Name of the score column.
+    :param weights: Weight of each column.
+    """
+    score = np.zeros(len(batch), dtype=np.float64)
+    for name, weight in weights.items():
+        score += batch[name] * weight
+    batch.add(field, score)
+
+
+def transform_columns(payload, source):
+    """
+    Transform a raw response into a ColumnBatch: one pass per column over the raw items,
+    then vectorized defaulting, type coercion and scoring.
+    :param payload: Raw JSON data from the API.
+    :param source: Source name, a key of COLUMN_SPECS.
+    :return: ColumnBatch with one row per item.
+    """
+    items = [item for item in raw_items(payload, source) if isinstance(item, dict)]
+    batch = ColumnBatch(length=len(items))
+    parents = {}
+    for field, path, kind, default in COLUMN_SPECS[source]:
+        batch.add(field, _column(_extract(items, path, default, parents), kind, default))
+    if source in COLUMN_SCORES:
+        score_columns(batch, *COLUMN_SCORES[source])
+    return batch
@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from registry import META_COLLECTION
+
+# Last page a crawl may reach
+CRAWL_MAX_PAGES = int(os.getenv("ETL_CRAWL_MAX_PAGES", "10"))
+
+# A saved cursor older than this is ignored and the crawl restarts from page 1
+CRAWL_CURSOR_TTL = timedelta(hours=float(os.getenv("ETL_CRAWL_CURSOR_TTL_HOURS", "6")))
+
+
+def _cursor_id(name):
+    return f"crawl:{name}"
+
+
+def load_cursor(db, name):
+    """
+    Return the last page ingested by an unfinished crawl, or 0 to start from page 1.
+    """
+    doc = db[META_COLLECTION].find_one({"_id": _cursor_id(name)})
+    if not doc:
+        return 0
+    updated_at = doc["updated_at"]
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - updated_at > CRAWL_CURSOR_TTL:
+        return 0
+    return doc["page"]
+
+
+def save_cursor(db, name, page):
+    db[META_COLLECTION].update_one(
+        {"_id": _cursor_id(name)},
+        {"$set": {"page": page, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+
+def reset_cursor(db, name):
+    db[META_COLLECTION].delete_one({"_id": _cursor_id(name)})
+
+
+def crawl_pages(db, name, fetch_page, transform, ingest_records, max_pages=CRAWL_MAX_PAGES, on_page=None):
+    """
+    Crawl a paginated source page by page, ingesting each page as soon as it is transformed.
+    The next page is fetched in the background while the current one is transformed and
+    ingested. The crawl stops on an empty page or after `max_pages`, then clears its cursor;
+    if it is interrupted, the next crawl resumes after the last ingested page.
+    :param db: MongoDB database holding the cursor.
+    :param name: Source name.
+    :param fetch_page: Function of a page number returning the raw JSON response.
+    :param transform: Transform function returning a sized batch of records (list or ColumnBatch).
+    :param ingest_records: Function ingesting a transformed batch and returning a summary dictionary.
+    :param max_pages: Last page to crawl.
+    :param on_page: Optional callback receiving (page, raw response), e.g. to archive it.
+    :return: Dictionary with the pages crawled and the merged ingest summary.
+    """
+    start = load_cursor(db, name) + 1
+    result = {"first_page": start, "pages": 0, "summary": {}}
+    if start > max_pages:
+        reset_cursor(db, name)
+        return result
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"crawl-{name}") as prefetcher:
+        pending = prefetcher.submit(fetch_page, start)
+        for page in range(start, max_pages + 1):
+            payload = pending.result()
+            if page < max_pages:
+                pending = prefetcher.submit(fetch_page, page + 1)
+            if on_page:
+                on_page(page, payload)
+
+            records = transform(payload)
+            if not records:
+                break
+            summary = ingest_records(records)
+            for key, count in summary.items():
+                result["summary"][key] = result["summary"].get(key, 0) + count
+            result["pages"] += 1
+            save_cursor(db, name, page)
+        # Stopped on an empty page: drop the prefetched page if it has not started yet.
+        pending.cancel()
+
+    reset_cursor(db, name)
+    return result
@@ -0,0 +1,81 @@
+import os
+
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient, MongoClient
+
+from metrics import MongoCommandMetrics
+from registry import DB_NAME
+
+# Load MONGO_URI and the pool settings from .env
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+
+# Connection pool settings shared by the sync and async clients
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "200")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
+    # Count and time every round trip for /metrics
+    "event_listeners": [MongoCommandMetrics()],
+}
+
+_client = None
+_async_client = None
+
+
+def get_client():
+    """
+    Return the process-wide blocking MongoDB client (ETL, scripts).
+    """
+    global _client
+    if _client is None:
+        _client = MongoClient(MONGO_URI, **POOL_OPTIONS)
+    return _client
+
+
+def get_database():
+    """
+    Return the trends database through the blocking client.
+    """
+    return get_client()[DB_NAME]
+
+
+def get_async_client():
+    """
+    Return the process-wide asyncio MongoDB client (API).
+    It must be created and used from the same event loop.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(MONGO_URI, **POOL_OPTIONS)
+    return _async_client
+
+
+def get_async_database():
+    """
+    Return the trends database through the asyncio client.
+    """
+    return get_async_client()[DB_NAME]
+
+
+async def close_async_client():
+    """
+    Close the asyncio client, e.g. on API shutdown.
+    """
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def close_client():
+    """
+    Close the blocking client.
+    """
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from registry import COLLECTIONS, HASH_FIELD, unlabelled_filter
+
+# Persistent memo of the labels of every text already scored, keyed by text_hash
+ENRICH_CACHE_COLLECTION = "enrichment_cache"
+
+# CPU text-classification models (Hugging Face ids)
+SENTIMENT_MODEL = os.getenv("ENRICH_SENTIMENT_MODEL", "cardiffnlp/twitter-roberta-base-sentiment-latest")
+TOPIC_MODEL = os.getenv("ENRICH_TOPIC_MODEL", "cardiffnlp/tweet-topic-21-multi")
+
+# Texts sent to a model per forward pass
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "32"))
+
+# Operations per bulk_write when storing labels
+ENRICH_WRITE_BATCH_SIZE = int(os.getenv("ENRICH_WRITE_BATCH_SIZE", "500"))
+
+# Text field labelled per source (each backed by an index declared in the registry)
+ENRICH_SOURCES = {
+    "tweeter": "name",
+    "trending_keywords": "keyword",
+    "youtube": "title",
+    "google_trends": "query",
+}
+
+_models = None
+_models_lock = threading.Lock()
+
+
+def normalize_text(text):
+    """
+    Normalize a text so that spelling variants of the same trend share their labels:
+    Unicode NFKC, lowercase, no leading #/@, collapsed whitespace.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"(?<!\w)[#@]", "", text)
+    return " ".join(text.split())
+
+
+def text_hash(text):
+    """
+    Memo key of a text: hash of its normalized form and of the models labelling it.
+    """
+    key = f"{SENTIMENT_MODEL}\0{TOPIC_MODEL}\0{normalize_text(text)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def load_models():
+    """
+    Load the sentiment and topic pipelines on CPU, once per process.
+    """
+    global _models
+    with _models_lock:
+        if _models is None:
+            from transformers import pipeline
+
+            _models = (
+                pipeline("text-classification", model=SENTIMENT_MODEL, device=-1),
+                pipeline("text-classification", model=TOPIC_MODEL, device=-1),
+            )
+    return _models
+
+
+def classify(texts, batch_size=ENRICH_BATCH_SIZE):
+    """
+    Label texts with their sentiment and topic, `batch_size` texts per forward pass.
+    :return: List of label dictionaries, in the order of `texts`.
+    """
+    sentiment_model, topic_model = load_models()
+    labels = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        sentiments = sentiment_model(batch, batch_size=batch_size, truncation=True)
+        topics = topic_model(batch, batch_size=batch_size, truncation=True)
+        for sentiment, topic in zip(sentiments, topics):
+            labels.append({
+                "sentiment": sentiment["label"],
+                "sentiment_score": float(sentiment["score"]),
+                "topic": topic["label"],
+                "topic_score": float(topic["score"]),
+            })
+    return labels
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _lookup_cache(cache_collection, hashes):
+    labels = {}
+    for chunk in _chunks(hashes, ENRICH_WRITE_BATCH_SIZE):
+        for doc in cache_collection.find({"_id": {"$in": chunk}}, {"text": 0, "created_at": 0}):
+            labels[doc.pop("_id")] = doc
+    return labels
+
+
+def _store_cache(cache_collection, entries):
+    created_at = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"_id": h}, {"$setOnInsert": dict(labels, text=text, created_at=created_at)}, upsert=True)
+        for h, (text, labels) in entries.items()
+    ]
+    for chunk in _chunks(operations, ENRICH_WRITE_BATCH_SIZE):
+        cache_collection.bulk_write(chunk, ordered=False)
+
+
+def enrich_source(db, source, field, stats, batch_size=ENRICH_BATCH_SIZE):
+    """
+    Label the documents of one source that have no HASH_FIELD: new ones, and those the ETL
+    rewrote (it drops the field on every write), so documents left untouched are not even read.
+    Labels come from the persistent memo when the normalized text was already scored;
+    only the remaining distinct texts go through the models.
+    :param stats: Dictionary of counters updated in place.
+    :return: Number of documents updated.
+    """
+    collection = db[COLLECTIONS[source]["collection"]]
+    cache_collection = db[ENRICH_CACHE_COLLECTION]
+
+    # Distinct texts needing labels, with the documents showing them
+    pending = {}
+    for doc in collection.find(unlabelled_filter(field), {field: 1}):
+        text = doc[field]
+        if not text.strip():
+            continue
+        pending.setdefault(text_hash(text), (normalize_text(text), []))[1].append(doc["_id"])
+    stats["texts"] += len(pending)
+
+    labels = _lookup_cache(cache_collection, list(pending))
+    missing = [h for h in pending if h not in labels]
+    if missing:
+        start = time.perf_counter()
+        inferred = classify([pending[h][0] for h in missing], batch_size)
+        stats["inference_seconds"] += time.perf_counter() - start
+        stats["inferred"] += len(missing)
+        new_entries = {h: (pending[h][0], item) for h, item in zip(missing, inferred)}
+        _store_cache(cache_collection, new_entries)
+        labels.update({h: item for h, (_, item) in new_entries.items()})
+
+    operations = [
+        UpdateOne({"_id": doc_id}, {"$set": dict(labels[h], **{HASH_FIELD: h})})
+        for h, (_, doc_ids) in pending.items()
+        for doc_id in doc_ids
+    ]
+    for chunk in _chunks(operations, ENRICH_WRITE_BATCH_SIZE):
+        collection.bulk_write(chunk, ordered=False)
+    stats["documents"] += len(operations)
+    return len(operations)
+
+
+def enrich_sources(db, sources=ENRICH_SOURCES, batch_size=ENRICH_BATCH_SIZE):
+    """
+    Run the enrichment stage over every source and report its throughput.
+    :return: Dictionary with the documents updated, distinct texts looked up in the memo, texts inferred,
+             items per second of inference and the memo hit ratio (lookups served without inference).
+    """
+    stats = {"documents": 0, "texts": 0, "inferred": 0, "inference_seconds": 0.0}
+    for source, field in sources.items():
+        enrich_source(db, source, field, stats, batch_size)
+    seconds = stats.pop("inference_seconds")
+    stats["items_per_second"] = stats["inferred"] / seconds if seconds else 0.0
+    stats["cache_hit_ratio"] = 1 - stats["inferred"] / stats["texts"] if stats["texts"] else 0.0
+    return stats
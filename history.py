@@ -0,0 +1,222 @@
+import os
+from datetime import timedelta
+
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+from registry import COLLECTIONS, unique_fields
+
+# Time-series collection holding one snapshot per entity and ETL run
+HISTORY_COLLECTION = "trend_snapshots"
+
+# Snapshots older than this are deleted by MongoDB
+HISTORY_RETENTION_DAYS = float(os.getenv("HISTORY_RETENTION_DAYS", "90"))
+
+# Number of snapshots sent per insert_many call
+SNAPSHOT_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "1000"))
+
+# Sources with a history.
+# metrics: numeric fields stored in every snapshot.
+# rank_by: (metric, order) ranking the entities of a bucket, 1 ascending, -1 descending.
+# scope: field holding the location/region of a fanned-out source, stored as meta.scope.
+# The entity key is the upsert key without the scope field.
+SNAPSHOT_SOURCES = {
+    "tweeter": {"metrics": ("post_count", "rank"), "rank_by": ("rank", 1), "scope": "location_id"},
+    "hashtag": {"metrics": ("tweet_volume",), "rank_by": ("tweet_volume", -1)},
+    "trending_keywords": {
+        "metrics": ("like", "share", "impression", "post", "trending_score"), "rank_by": ("trending_score", -1)
+    },
+    "trending_ads": {"metrics": ("like", "ctr", "cost"), "rank_by": ("like", -1)},
+    "trending_hashtags": {
+        "metrics": ("rank", "rank_diff", "publish_cnt", "video_views"), "rank_by": ("rank", 1)
+    },
+    "youtube": {"metrics": ("view_count",), "rank_by": ("view_count", -1), "scope": "geo"},
+    "google_trends": {"metrics": ("formatted_traffic",), "rank_by": ("formatted_traffic", -1), "scope": "region_code"},
+}
+
+# Bucket sizes accepted by the read queries: name -> ($dateTrunc unit, bin size, duration)
+BUCKETS = {
+    "15m": ("minute", 15, timedelta(minutes=15)),
+    "1h": ("hour", 1, timedelta(hours=1)),
+    "6h": ("hour", 6, timedelta(hours=6)),
+    "1d": ("day", 1, timedelta(days=1)),
+}
+
+# Largest number of buckets a read query may span
+MAX_HISTORY_BUCKETS = int(os.getenv("HISTORY_MAX_BUCKETS", "2000"))
+
+# Separator of the fields of a compound entity key
+KEY_SEPARATOR = "|"
+
+
+def ensure_history_collection(db, retention_days=HISTORY_RETENTION_DAYS):
+    """
+    Create the snapshot time-series collection and its indexes, or update its retention.
+    :param db: MongoDB database.
+    :return: True if the collection is ready, False if the server refused it (e.g. before MongoDB 5.0).
+    """
+    expire_after = int(retention_days * 86400)
+    try:
+        if HISTORY_COLLECTION in db.list_collection_names():
+            db.command("collMod", HISTORY_COLLECTION, expireAfterSeconds=expire_after)
+        else:
+            try:
+                db.create_collection(
+                    HISTORY_COLLECTION,
+                    timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+                    expireAfterSeconds=expire_after
+                )
+            except CollectionInvalid:
+                pass  # Created concurrently
+        collection = db[HISTORY_COLLECTION]
+        collection.create_index([("meta.source", ASCENDING), ("meta.key", ASCENDING), ("ts", ASCENDING)])
+        collection.create_index([("meta.source", ASCENDING), ("meta.scope", ASCENDING), ("ts", ASCENDING)])
+    except OperationFailure as e:
+        print(f"Error: could not set up the '{HISTORY_COLLECTION}' time-series collection: {e}")
+        return False
+    return True
+
+
+def entity_key(record, fields):
+    """
+    Return the key identifying an entity across runs, or None if a key field is missing.
+    """
+    values = [record.get(field) for field in fields]
+    if any(value is None for value in values):
+        return None
+    return KEY_SEPARATOR.join(str(value) for value in values)
+
+
+def _key_fields(source):
+    scope = SNAPSHOT_SOURCES[source].get("scope")
+    return [field for field in unique_fields(COLLECTIONS[source]) if field != scope]
+
+
+def make_snapshot(source, record, at):
+    """
+    Build the snapshot of a transformed record: run time, entity and numeric metrics.
+    :return: Snapshot document, or None if the record has no key.
+    """
+    spec = SNAPSHOT_SOURCES[source]
+    key = entity_key(record, _key_fields(source))
+    if key is None:
+        return None
+    meta = {"source": source, "key": key}
+    if spec.get("scope"):
+        meta["scope"] = record.get(spec["scope"])
+    snapshot = {"ts": at, "meta": meta}
+    for metric in spec["metrics"]:
+        value = record.get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            snapshot[metric] = value
+    return snapshot
+
+
+def snapshot_records(collection, source, records, at, batch_size=SNAPSHOT_BATCH_SIZE):
+    """
+    Yield records unchanged while appending a snapshot of each one to the history collection.
+    Snapshots are inserted in batches; a failed insert is reported and does not stop ingest.
+    :param collection: History collection.
+    :param source: Source name; sources without a history are passed through.
+    :param records: Iterable of transformed records.
+    :param at: Run timestamp shared by every snapshot of the run.
+    """
+    if source not in SNAPSHOT_SOURCES:
+        yield from records
+        return
+    buffer = []
+
+    def flush():
+        try:
+            collection.insert_many(buffer, ordered=False)
+        except PyMongoError as e:
+            print(f"Error: could not store {len(buffer)} '{source}' snapshots: {e}")
+        buffer.clear()
+
+    for record in records:
+        snapshot = make_snapshot(source, record, at)
+        if snapshot is not None:
+            buffer.append(snapshot)
+            if len(buffer) >= batch_size:
+                flush()
+        yield record
+    if buffer:
+        flush()
+
+
+def _check_window(start, end, bucket):
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}'")
+    if end <= start:
+        raise ValueError("The end of the window must be after its start")
+    if (end - start) / BUCKETS[bucket][2] > MAX_HISTORY_BUCKETS:
+        raise ValueError(f"The window spans more than {MAX_HISTORY_BUCKETS} '{bucket}' buckets")
+
+
+def _match_scope(source, match, scope):
+    # Points of different locations/regions cannot be merged into one series or ranking
+    field = SNAPSHOT_SOURCES[source].get("scope")
+    if scope is not None:
+        match["meta.scope"] = scope
+    elif field:
+        raise ValueError(f"'{source}' is recorded per {field}: a scope is required")
+
+
+def _bucket_expr(bucket):
+    unit, size, _ = BUCKETS[bucket]
+    return {"$dateTrunc": {"date": "$ts", "unit": unit, "binSize": size}}
+
+
+def series_pipeline(source, key, start, end, bucket="1h", scope=None):
+    """
+    Aggregation pipeline returning one point per bucket for an entity: the last value of each
+    metric within the bucket, oldest bucket first.
+    :param scope: Location/region of the entity, required for the sources fanned out over them.
+    :raises ValueError: On an unknown bucket, a window spanning too many buckets or a missing scope.
+    """
+    _check_window(start, end, bucket)
+    match = {"meta.source": source, "meta.key": key, "ts": {"$gte": start, "$lt": end}}
+    _match_scope(source, match, scope)
+    group = {"_id": _bucket_expr(bucket)}
+    for metric in SNAPSHOT_SOURCES[source]["metrics"]:
+        group[metric] = {"$last": f"${metric}"}
+    return [
+        {"$match": match},
+        {"$sort": {"ts": 1}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+        {"$project": dict({"_id": 0, "ts": "$_id"}, **{metric: 1 for metric in SNAPSHOT_SOURCES[source]["metrics"]})},
+    ]
+
+
+def ranks_pipeline(source, start, end, bucket="1h", scope=None, keys=None, top=10):
+    """
+    Aggregation pipeline ranking the entities of every bucket by the source's rank metric
+    (last value within the bucket), oldest bucket first.
+    :param scope: Location/region ranked, required for the sources fanned out over them.
+    :param keys: Optional entity keys to follow; otherwise the `top` entities of each bucket are kept.
+    :raises ValueError: On an unknown bucket, a window spanning too many buckets or a missing scope.
+    """
+    _check_window(start, end, bucket)
+    metric, order = SNAPSHOT_SOURCES[source]["rank_by"]
+    match = {"meta.source": source, "ts": {"$gte": start, "$lt": end}, metric: {"$ne": None}}
+    _match_scope(source, match, scope)
+    keep = {"_id.key": {"$in": list(keys)}} if keys else {"rank": {"$lte": top}}
+    return [
+        {"$match": match},
+        {"$sort": {"ts": 1}},
+        {"$group": {"_id": {"bucket": _bucket_expr(bucket), "key": "$meta.key"}, "value": {"$last": f"${metric}"}}},
+        {"$setWindowFields": {
+            "partitionBy": "$_id.bucket",
+            "sortBy": {"value": order},
+            "output": {"rank": {"$rank": {}}},
+        }},
+        {"$match": keep},
+        {"$sort": {"_id.bucket": 1, "rank": 1}},
+        {"$group": {
+            "_id": "$_id.bucket",
+            "entities": {"$push": {"key": "$_id.key", "rank": "$rank", metric: "$value"}},
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "ts": "$_id", "entities": 1}},
+    ]
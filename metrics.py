@@ -0,0 +1,270 @@
+import contextlib
+import contextvars
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import monitoring
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Port of the /metrics endpoint of long-running ETL processes (the scheduler); 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9101"))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Set of metrics rendered together in the Prometheus text format.
+    Collectors are functions called at render time, returning (name, type, help, samples) tuples,
+    samples being (labels, value) pairs; they export values kept elsewhere (e.g. cache counters).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """
+        :return: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.exposed_name} {metric.help}")
+            lines.append(f"# TYPE {metric.exposed_name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    @property
+    def exposed_name(self):
+        return self.name
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    @property
+    def exposed_name(self):
+        return f"{self.name}_total"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.exposed_name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the block, even if it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield f"{self.name}_bucket", dict(labels, le="+Inf"), count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+## ETL :
+
+ETL_STAGE_SECONDS = Histogram(
+    "etl_stage_seconds", "Duration of an ETL stage (fetch, decode, transform, ingest) for a source.",
+    ("stage", "source")
+)
+ETL_BYTES_RECEIVED = Counter("etl_bytes_received", "Response bytes received from the APIs.", ("source",))
+ETL_RECORDS_TRANSFORMED = Counter("etl_records_transformed", "Records produced by the transforms.", ("source",))
+ETL_RECORDS_WRITTEN = Counter("etl_records_written", "Records inserted or modified in MongoDB.", ("source",))
+ETL_RECORDS_SKIPPED = Counter("etl_records_skipped", "Records left unwritten, their content being unchanged.", ("source",))
+
+# Source whose data the current thread is handling, for the stages that do not know it (HTTP client)
+_current_source = contextvars.ContextVar("etl_source", default="")
+
+
+@contextlib.contextmanager
+def source_context(source):
+    """
+    Attribute the fetch, decode and byte metrics recorded within the block to a source.
+    """
+    token = _current_source.set(source)
+    try:
+        yield
+    finally:
+        _current_source.reset(token)
+
+
+def current_source():
+    return _current_source.get()
+
+
+def stage(name, source=None):
+    """
+    Time an ETL stage: `with stage("transform", "youtube"): ...`.
+    The source defaults to the one of the enclosing source_context.
+    """
+    return ETL_STAGE_SECONDS.time(stage=name, source=current_source() if source is None else source)
+
+
+def record_ingest(source, transformed, summary):
+    """
+    Count the records of a bulk upsert from its summary.
+    """
+    ETL_RECORDS_TRANSFORMED.inc(transformed, source=source)
+    ETL_RECORDS_WRITTEN.inc(summary.get("upserted", 0) + summary.get("modified", 0), source=source)
+    ETL_RECORDS_SKIPPED.inc(summary.get("skipped", 0), source=source)
+
+
+## MongoDB :
+
+MONGO_COMMANDS = Counter("mongo_commands", "MongoDB round trips by command and outcome.", ("command", "outcome"))
+MONGO_COMMAND_SECONDS = Histogram("mongo_command_seconds", "MongoDB round-trip duration by command.", ("command",))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Command listener counting and timing every MongoDB round trip; pass it to the clients' event_listeners.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMANDS.inc(command=event.command_name, outcome="succeeded")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMANDS.inc(command=event.command_name, outcome="failed")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+
+## API :
+
+API_REQUEST_SECONDS = Histogram(
+    "api_request_seconds", "API request latency by endpoint.", ("method", "endpoint", "status")
+)
+
+
+def serve(port=METRICS_PORT, registry=REGISTRY):
+    """
+    Serve /metrics from a background thread, for processes without a web server (the scheduler).
+    :return: The HTTP server, or None if `port` is 0.
+    """
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,303 @@
+import math
+import re
+
+## Coercion :
+# Every field of a record model has a coercion function turning the raw API value into its
+# stored type. Missing (None) or unparseable values become the field default.
+
+# A number, optionally with thousands separators and a K/M/B suffix: "1.2M views", "20K+", "12,345 posts"
+_COUNT_PATTERN = re.compile(r"([-+]?\d[\d,]*(?:\.\d+)?)\s*([kmb](?![a-z]))?", re.IGNORECASE)
+_MULTIPLIERS = {"k": 1e3, "m": 1e6, "b": 1e9}
+
+def parse_count(text):
+    """
+    Parse a display count such as "1.2M views", "20K+" or "12,345 posts".
+    :param text: String holding a number.
+    :return: The number as a float, or None if the text holds no number.
+    """
+    # Plain numbers, exponents included ("1e3"), are read as float() reads them, like the columnar engine
+    try:
+        number = float(text)
+    except ValueError:
+        pass
+    else:
+        return number if math.isfinite(number) else None
+    match = _COUNT_PATTERN.search(text)
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", ""))
+    suffix = match.group(2)
+    return number * _MULTIPLIERS[suffix.lower()] if suffix else number
+
+def to_float(value, default=0.0):
+    kind = type(value)
+    if kind is float:
+        return value if math.isfinite(value) else default
+    if kind is int:
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else default
+    if isinstance(value, str):
+        number = parse_count(value)
+        return default if number is None else number
+    return default
+
+def to_int(value, default=0):
+    if type(value) is int:
+        return value
+    number = to_float(value, None)
+    return default if number is None else int(round(number))
+
+def optional_int(value):
+    return to_int(value, None)
+
+def to_str(value, default=""):
+    if isinstance(value, str):
+        return value
+    return default if value is None else str(value)
+
+def optional_str(value):
+    return to_str(value, None)
+
+def to_bool(value, default=False):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return default if value is None else bool(value)
+
+def to_str_list(value):
+    return [to_str(item) for item in value] if isinstance(value, list) else []
+
+def to_list(value):
+    return value if isinstance(value, list) else []
+
+def joined(value):
+    return "; ".join(to_str_list(value))
+
+def raw(value):
+    return value
+
+def records_of(model):
+    """
+    Coercion of a list of nested items to a list of dictionaries of `model`.
+    """
+    def coerce(value):
+        if not isinstance(value, list):
+            return []
+        return [model.from_raw(item).to_dict() for item in value if isinstance(item, dict)]
+    return coerce
+
+## Models :
+
+def _lookup(item, path):
+    if isinstance(path, str):
+        return item.get(path)
+    for key in path:
+        if isinstance(item, dict):
+            item = item.get(key)
+        elif isinstance(item, list) and isinstance(key, int) and -len(item) <= key < len(item):
+            item = item[key]
+        else:
+            return None
+    return item
+
+def _slots(fields):
+    return tuple(name for name, _, _ in fields)
+
+class Record:
+    """
+    Base of the typed record models.
+    FIELDS lists (stored field, key or key path in the raw item, coercion function) in slot order.
+    """
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_raw(cls, item):
+        """
+        Build a record from a raw API item, coercing every field to its type.
+        """
+        record = cls.__new__(cls)
+        for name, path, coerce in cls.FIELDS:
+            setattr(record, name, coerce(item.get(path) if path.__class__ is str else _lookup(item, path)))
+        return record
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+class TwitterTrend(Record):
+    FIELDS = (
+        ("name", "name", optional_str),
+        ("post_count", "postCount", optional_int),
+        ("domain", "domain", optional_str),
+        ("rank", "rank", optional_int),
+        ("mobile_url", "mobileIntent", optional_str),
+        ("web_url", "webUrl", optional_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TwitterLocation(Record):
+    FIELDS = (
+        ("name", "name", optional_str),
+        ("place_id", "placeID", optional_str),
+        ("location_type", "locationType", optional_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TwitterHashtag(Record):
+    FIELDS = (
+        ("name", "name", optional_str),
+        ("url", "url", optional_str),
+        ("tweet_volume", "tweet_volume", optional_int),
+        ("update_time", "agencyDataUpdateTime", raw),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TikTokTagMetrics(Record):
+    FIELDS = (
+        ("trending_score", "trendingScore", to_str),
+        ("viral_potential", "viralPotential", to_str),
+        ("reach_estimate", "reachEstimate", to_str),
+        ("competition_level", "competitionLevel", to_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TrendingKeyword(Record):
+    FIELDS = (
+        ("keyword", "keyword", to_str),
+        ("comment", "comment", to_int),
+        ("cost", "cost", to_float),
+        ("cpa", "cpa", to_float),
+        ("ctr", "ctr", to_float),
+        ("cvr", "cvr", to_float),
+        ("impression", "impression", to_int),
+        ("like", "like", to_int),
+        ("play_six_rate", "play_six_rate", to_float),
+        ("post", "post", to_int),
+        ("post_change", "post_change", to_float),
+        ("share", "share", to_int),
+        ("video_list", "video_list", joined),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TrendingAd(Record):
+    FIELDS = (
+        ("ad_title", "ad_title", to_str),
+        ("brand_name", "brand_name", to_str),
+        ("cost", "cost", to_float),
+        ("ctr", "ctr", to_float),
+        ("favorite", "favorite", to_bool),
+        ("id", "id", to_str),
+        ("industry_key", "industry_key", to_str),
+        ("is_search", "is_search", to_bool),
+        ("like", "like", to_int),
+        ("objective_key", "objective_key", to_str),
+        ("video_id", ("video_info", "vid"), to_str),
+        ("video_duration", ("video_info", "duration"), to_float),
+        ("video_cover", ("video_info", "cover"), to_str),
+        ("video_url_720p", ("video_info", "video_url", "720p"), to_str),
+        ("video_width", ("video_info", "width"), to_int),
+        ("video_height", ("video_info", "height"), to_int),
+    )
+    __slots__ = _slots(FIELDS)
+
+class HashtagTrendPoint(Record):
+    FIELDS = (
+        ("time", "time", to_int),
+        ("value", "value", to_float),
+    )
+    __slots__ = _slots(FIELDS)
+
+class HashtagCreator(Record):
+    FIELDS = (
+        ("nick_name", "nick_name", to_str),
+        ("avatar_url", "avatar_url", to_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class TrendingHashtag(Record):
+    FIELDS = (
+        ("hashtag_id", "hashtag_id", to_str),
+        ("hashtag_name", "hashtag_name", to_str),
+        ("country_id", ("country_info", "id"), to_str),
+        ("country_name", ("country_info", "value"), to_str),
+        ("is_promoted", "is_promoted", to_bool),
+        ("trend", "trend", records_of(HashtagTrendPoint)),
+        ("creators", "creators", records_of(HashtagCreator)),
+        ("publish_cnt", "publish_cnt", to_int),
+        ("video_views", "video_views", to_int),
+        ("rank", "rank", to_int),
+        ("rank_diff", "rank_diff", to_int),
+        ("rank_diff_type", "rank_diff_type", to_int),
+    )
+    __slots__ = _slots(FIELDS)
+
+class YoutubeThumbnail(Record):
+    FIELDS = (
+        ("url", "url", to_str),
+        ("width", "width", to_int),
+        ("height", "height", to_int),
+    )
+    __slots__ = _slots(FIELDS)
+
+class YoutubeVideo(Record):
+    FIELDS = (
+        ("video_id", "videoId", to_str),
+        ("title", "title", to_str),
+        ("channel_title", "channelTitle", to_str),
+        ("channel_id", "channelId", to_str),
+        ("channel_handle", "channelHandle", to_str),
+        ("channel_thumbnail", ("channelThumbnail", 0, "url"), to_str),
+        ("description", "description", to_str),
+        ("view_count", "viewCount", to_int),
+        ("published_time_text", "publishedTimeText", to_str),
+        ("publish_date", "publishDate", to_str),
+        ("length_text", "lengthText", to_str),
+        ("thumbnails", "thumbnail", records_of(YoutubeThumbnail)),
+    )
+    __slots__ = _slots(FIELDS)
+
+class GoogleTrendImage(Record):
+    FIELDS = (
+        ("news_url", "newsUrl", to_str),
+        ("source", "source", to_str),
+        ("image_url", "imageUrl", to_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class GoogleTrendArticle(Record):
+    FIELDS = (
+        ("title", "title", to_str),
+        ("time_ago", "timeAgo", to_str),
+        ("source", "source", to_str),
+        ("news_url", ("image", "newsUrl"), to_str),
+        ("image_url", ("image", "imageUrl"), to_str),
+        ("url", "url", to_str),
+        ("snippet", "snippet", to_str),
+    )
+    __slots__ = _slots(FIELDS)
+
+class GoogleTrend(Record):
+    FIELDS = (
+        ("query", "query", to_str),
+        ("formatted_traffic", "formattedTraffic", to_int),
+        ("related_queries", "relatedQueries", to_list),
+        ("image", "image", lambda value: GoogleTrendImage.from_raw(value if isinstance(value, dict) else {}).to_dict()),
+        ("articles", "articles", records_of(GoogleTrendArticle)),
+    )
+    __slots__ = _slots(FIELDS)
+
+class GoogleRegion(Record):
+    FIELDS = (
+        ("code", "code", to_str),
+        ("name", "name", to_str),
+    )
+    __slots__ = _slots(FIELDS)
@@ -0,0 +1,92 @@
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Sampling period of the profiler, in seconds
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+
+# Directory receiving the profiles of API requests
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread samples the stack of every other thread at a fixed
+    period. Samples are aggregated as folded stacks ("thread;outer;...;inner count" lines), the
+    input of flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        # Sample right away, so that even a run shorter than the interval gets a profile
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            if self._stop.wait(self.interval):
+                break
+
+    def folded(self):
+        """
+        :return: The profile as folded stacks, most sampled first.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.folded())
+        return path
+
+
+@contextlib.contextmanager
+def profile(path, interval=PROFILE_INTERVAL):
+    """
+    Sample every thread while the block runs and write the folded stacks to `path`.
+    """
+    profiler = SamplingProfiler(interval).start()
+    start = time.perf_counter()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(path)
+        print(f"Profile: {profiler.samples} samples over {time.perf_counter() - start:.1f}s written to {path}")
@@ -0,0 +1,230 @@
+import os
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Database of the trends collections (the benchmark suite points it at its own)
+DB_NAME = os.getenv("MONGO_DB", "trends_db")
+
+# Collection holding ETL bookkeeping (generation counter, cursors)
+META_COLLECTION = "etl_meta"
+
+# Name of the unique index backing each collection's upsert key
+UPSERT_INDEX = "upsert_key"
+
+# Hash of the text the enrichment labels of a document were computed from; the ETL drops it on every write
+HASH_FIELD = "enrichment_hash"
+
+
+def unlabelled_filter(field):
+    """
+    Filter of the documents enrichment has to label: a `field` text and no HASH_FIELD.
+    """
+    return {field: {"$type": "string"}, HASH_FIELD: {"$exists": False}}
+
+
+def _enrichment_index(field):
+    """
+    Index serving unlabelled_filter(field): documents without HASH_FIELD are indexed under null,
+    and only those holding a `field` text are indexed at all.
+    """
+    return [(HASH_FIELD, ASCENDING)], {"partialFilterExpression": {field: {"$type": "string"}}}
+
+
+# Declarative registry of the ETL collections.
+# unique: field, or tuple of fields, the ETL upserts on (backed by a unique index).
+#         Sources fanned out over locations/regions include the scope field in their key.
+# indexes: secondary indexes needed by the API and enrichment queries, as key lists or (keys, options) pairs.
+# queries: representative API queries as (filter, sort) pairs, checked for COLLSCAN plans.
+COLLECTIONS = {
+    "tweeter": {
+        "collection": "tweeter_trends",
+        "unique": ("location_id", "name"),
+        "indexes": [
+            [("post_count", DESCENDING), ("_id", DESCENDING)],
+            [("rank", ASCENDING), ("_id", ASCENDING)],
+            [("name", ASCENDING), ("_id", ASCENDING)],
+            [("domain", ASCENDING), ("post_count", DESCENDING), ("_id", DESCENDING)],
+            [("location_id", ASCENDING), ("post_count", DESCENDING), ("_id", DESCENDING)],
+            _enrichment_index("name"),
+        ],
+        "queries": [
+            ({}, [("post_count", DESCENDING), ("_id", DESCENDING)]),
+            ({}, [("rank", ASCENDING), ("_id", ASCENDING)]),
+            ({"domain": ""}, [("post_count", DESCENDING), ("_id", DESCENDING)]),
+            ({"location_id": ""}, [("post_count", DESCENDING), ("_id", DESCENDING)]),
+            (unlabelled_filter("name"), None),
+        ],
+    },
+    "location": {
+        "collection": "location_trends",
+        "unique": "name",
+        "indexes": [],
+        "queries": [],
+    },
+    "hashtag": {
+        "collection": "hashtag_trends",
+        "unique": "name",
+        "indexes": [],
+        "queries": [],
+    },
+    "tiktok": {
+        "collection": "tiktok_trends",
+        "unique": "tag",
+        "indexes": [],
+        "queries": [],
+    },
+    "trending_keywords": {
+        "collection": "trending_keywords_trends",
+        "unique": "keyword",
+        "indexes": [[("share", DESCENDING)], [("trending_score", DESCENDING)], _enrichment_index("keyword")],
+        "queries": [
+            ({}, [("share", DESCENDING)]),
+            ({}, [("trending_score", DESCENDING)]),
+            (unlabelled_filter("keyword"), None),
+        ],
+    },
+    "trending_ads": {
+        "collection": "trending_ads_trends",
+        "unique": "ad_title",
+        "indexes": [],
+        "queries": [],
+    },
+    "trending_hashtags": {
+        "collection": "trending_hashtags_trends",
+        "unique": "hashtag_name",
+        "indexes": [],
+        "queries": [],
+    },
+    "youtube": {
+        "collection": "youtube_trends",
+        "unique": ("geo", "video_id"),
+        "indexes": [_enrichment_index("title")],
+        "queries": [(unlabelled_filter("title"), None)],
+    },
+    "google_trends": {
+        "collection": "google_trends_trends",
+        "unique": ("region_code", "query"),
+        "indexes": [_enrichment_index("query")],
+        "queries": [(unlabelled_filter("query"), None)],
+    },
+    "google_regions": {
+        "collection": "google_regions",
+        "unique": "code",
+        "indexes": [],
+        "queries": [],
+    },
+}
+
+# Server error codes raised when an index exists with a different definition
+_INDEX_CONFLICT_CODES = (85, 86)
+
+
+def get_collections(db):
+    """
+    Map every registry entry to its MongoDB collection.
+    :param db: MongoDB database.
+    :return: Dictionary of source name to collection.
+    """
+    return {name: db[spec["collection"]] for name, spec in COLLECTIONS.items()}
+
+
+def unique_fields(spec):
+    """
+    Return the upsert key of a registry entry as a tuple of fields.
+    """
+    return (spec["unique"],) if isinstance(spec["unique"], str) else tuple(spec["unique"])
+
+
+def _index_specs(spec):
+    """
+    List the (keys, options) pairs a registry entry requires.
+    """
+    upsert_keys = [(field, ASCENDING) for field in unique_fields(spec)]
+    specs = [(upsert_keys, {"name": UPSERT_INDEX, "unique": True})]
+    for index in spec["indexes"]:
+        specs.append(index if isinstance(index, tuple) else (index, {}))
+    return specs
+
+
+def _create_index(collection, keys, options):
+    try:
+        return collection.create_index(keys, **options)
+    except OperationFailure as e:
+        if e.code not in _INDEX_CONFLICT_CODES:
+            raise
+        # The definition changed: replace the index with the same name.
+        collection.drop_index(options.get("name") or "_".join(f"{k}_{d}" for k, d in keys))
+        return collection.create_index(keys, **options)
+
+
+def ensure_indexes(db):
+    """
+    Create every index declared in COLLECTIONS. An index whose definition changed is rebuilt.
+    :param db: MongoDB database.
+    :return: Dictionary of source name to the list of index names that could not be created.
+    """
+    failures = {}
+    for name, spec in COLLECTIONS.items():
+        collection = db[spec["collection"]]
+        for keys, options in _index_specs(spec):
+            try:
+                _create_index(collection, keys, options)
+            except OperationFailure as e:
+                print(f"Error: could not create index {keys} on '{collection.name}': {e}")
+                failures.setdefault(name, []).append(options.get("name", str(keys)))
+    return failures
+
+
+def _plan_stages(plan):
+    """
+    Yield every stage name of an explain() plan tree.
+    """
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _plan_stages(value)
+
+
+def check_indexes(db):
+    """
+    Report missing indexes and registry queries whose winning plan is a COLLSCAN.
+    :param db: MongoDB database.
+    :return: Dictionary of source name to {"missing": [...], "collscan": [...]}, only for
+             collections with a problem.
+    """
+    report = {}
+    for name, spec in COLLECTIONS.items():
+        collection = db[spec["collection"]]
+        existing = {
+            tuple((k, d if isinstance(d, str) else int(d)) for k, d in info["key"])
+            for info in collection.index_information().values()
+        }
+        missing = [keys for keys, _ in _index_specs(spec) if tuple(keys) not in existing]
+
+        queries = [({field: "" for field in unique_fields(spec)}, None)] + spec["queries"]
+        collscan = []
+        for query_filter, sort in queries:
+            cursor = collection.find(query_filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.limit(10).explain().get("queryPlanner", {}).get("winningPlan", {})
+            if "COLLSCAN" in _plan_stages(plan):
+                collscan.append({"filter": query_filter, "sort": sort})
+
+        if missing or collscan:
+            report[name] = {"missing": missing, "collscan": collscan}
+    return report
+
+
+if __name__ == "__main__":
+    from db import get_database
+
+    problems = check_indexes(get_database())
+    for name, problem in problems.items():
+        print(f"{name}: {problem}")
+    print("All indexes present, no COLLSCAN plans." if not problems else f"{len(problems)} collection(s) need attention.")
@@ -0,0 +1,323 @@
+import os
+import random
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from registry import META_COLLECTION
+
+# Base refresh interval of each source, in seconds. Reference data (locations, regions) changes rarely.
+SCHEDULE_INTERVALS = {
+    "tweeter": 900,
+    "hashtag": 900,
+    "google_trends": 900,
+    "youtube": 1800,
+    "trending_keywords": 1800,
+    "trending_hashtags": 1800,
+    "trending_ads": 3600,
+    "tiktok": 3600,
+    "location": 86400,
+    "google_regions": 604800,
+}
+
+# Interval overrides: "source=seconds" pairs, comma-separated, e.g. "tweeter=600,location=43200"
+SCHEDULE_OVERRIDES = os.getenv("SCHEDULE_INTERVALS", "")
+
+# Random spread applied to every delay, as a fraction of it (0.1 = +/-10%)
+SCHEDULE_JITTER = float(os.getenv("SCHEDULE_JITTER", "0.1"))
+
+# Factor applied to the interval after a run that changed nothing (and undone after a run that did)
+SCHEDULE_BACKOFF = float(os.getenv("SCHEDULE_BACKOFF", "2"))
+
+# Longest interval, as a multiple of the base interval
+SCHEDULE_MAX_BACKOFF = float(os.getenv("SCHEDULE_MAX_BACKOFF", "8"))
+
+# First retry delay after a failed run, doubled (SCHEDULE_BACKOFF) on every further failure up to the interval
+SCHEDULE_RETRY_SECONDS = float(os.getenv("SCHEDULE_RETRY_SECONDS", "60"))
+
+# Sources run concurrently
+SCHEDULE_WORKERS = int(os.getenv("SCHEDULE_WORKERS", "4"))
+
+# A run holding its lease longer than this is considered dead and the source can be claimed again
+SCHEDULE_LEASE_SECONDS = int(os.getenv("SCHEDULE_LEASE_SECONDS", "3600"))
+
+# Longest sleep of the scheduler loop, so that state changes made elsewhere are noticed
+SCHEDULE_POLL_SECONDS = float(os.getenv("SCHEDULE_POLL_SECONDS", "30"))
+
+# Prefix of the META_COLLECTION documents holding the state of each source
+STATE_PREFIX = "schedule:"
+
+# Outcomes of a run
+CHANGED, UNCHANGED, FAILED = "changed", "unchanged", "failed"
+
+
+def parse_intervals(overrides=SCHEDULE_OVERRIDES, defaults=SCHEDULE_INTERVALS):
+    """
+    Merge "source=seconds" overrides into the default intervals.
+    :raises ValueError: On an unknown source or a malformed pair.
+    """
+    intervals = dict(defaults)
+    for pair in overrides.split(","):
+        if not pair.strip():
+            continue
+        name, _, seconds = pair.partition("=")
+        name = name.strip()
+        if name not in defaults:
+            raise ValueError(f"Unknown source '{name}' in SCHEDULE_INTERVALS")
+        intervals[name] = float(seconds)
+    return intervals
+
+
+def _state_id(name):
+    return f"{STATE_PREFIX}{name}"
+
+
+def run_outcome(summaries, name):
+    """
+    Classify a run from its ingest summaries: FAILED if no task of the source was ingested,
+    UNCHANGED if every record matched its stored fingerprint, CHANGED otherwise.
+    """
+    ingested = [summary for key, summary in summaries.items()
+                if (key[0] if isinstance(key, tuple) else key) == name and summary]
+    if not ingested:
+        return FAILED
+    if any(summary.get("upserted", 0) or summary.get("modified", 0) for summary in ingested):
+        return CHANGED
+    return UNCHANGED
+
+
+def next_interval(interval, base, outcome, backoff=SCHEDULE_BACKOFF, max_backoff=SCHEDULE_MAX_BACKOFF):
+    """
+    Adapt a source's interval to its observed change rate: stretch it after an unchanged payload,
+    shrink it back towards the base after a changed one. Failures leave it as is.
+    """
+    if outcome == UNCHANGED:
+        return min(interval * backoff, base * max_backoff)
+    if outcome == CHANGED:
+        return max(interval / backoff, base)
+    return interval
+
+
+def next_delay(interval, failures, retry=SCHEDULE_RETRY_SECONDS, backoff=SCHEDULE_BACKOFF,
+               jitter=SCHEDULE_JITTER, rng=random):
+    """
+    Delay before the next run: the interval, or an exponential retry delay (capped by the interval)
+    after failures, spread by +/- `jitter` so that sources with the same interval do not fire together.
+    """
+    if failures:
+        delay = min(retry * backoff ** (failures - 1), interval)
+    else:
+        delay = interval
+    return delay * (1 + rng.uniform(-jitter, jitter))
+
+
+class Scheduler:
+    """
+    Long-running ETL trigger: runs every source on its own adaptive interval.
+    The state of each source is a document of META_COLLECTION, which doubles as a lease: a source
+    is only run by the scheduler that claimed it, so a source never has two runs in flight,
+    even with several schedulers.
+    """
+
+    def __init__(self, db, run, intervals=None, workers=SCHEDULE_WORKERS, lease_seconds=SCHEDULE_LEASE_SECONDS):
+        """
+        :param db: MongoDB database holding the state.
+        :param run: Function of a source name running its ETL and returning the ingest summaries.
+        :param intervals: Base interval of each scheduled source (default: SCHEDULE_INTERVALS with overrides).
+        :param workers: Sources run concurrently.
+        :param lease_seconds: Lease duration of a run.
+        """
+        self.db = db
+        self.run = run
+        self.intervals = parse_intervals() if intervals is None else intervals
+        self.lease = timedelta(seconds=lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schedule")
+
+    @property
+    def collection(self):
+        return self.db[META_COLLECTION]
+
+    def setup(self, now=None):
+        """
+        Create the state of every scheduled source, due immediately, keeping the state of earlier runs.
+        A changed base interval resets the adapted one.
+        """
+        now = now or datetime.now(timezone.utc)
+        for name, base in self.intervals.items():
+            try:
+                self.collection.update_one(
+                    {"_id": _state_id(name)},
+                    {"$setOnInsert": {
+                        "source": name, "interval": base, "next_run_at": now, "failures": 0,
+                        "unchanged_runs": 0, "running": False, "owner": None, "lease_expires_at": None,
+                    }},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # Created concurrently
+            self.collection.update_one(
+                {"_id": _state_id(name), "base_interval": {"$ne": base}},
+                {"$set": {"base_interval": base, "interval": base}}
+            )
+
+    def state(self):
+        """
+        :return: State of every scheduled source, next to run first.
+        """
+        return list(self.collection.find({"_id": {"$in": [_state_id(name) for name in self.intervals]}},
+                                         {"_id": 0}).sort("next_run_at", 1))
+
+    def claim(self, name, now=None):
+        """
+        Take the lease of a due source that no one is running.
+        :return: The source state, or None if it is not due or already claimed.
+        """
+        now = now or datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            {
+                "_id": _state_id(name),
+                "next_run_at": {"$lte": now},
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lte": now}}],
+            },
+            {"$set": {
+                "running": True, "owner": self.owner, "lease_expires_at": now + self.lease, "last_started_at": now,
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def complete(self, state, outcome, summary, now=None):
+        """
+        Record the outcome of a run, schedule the next one and release the lease.
+        """
+        now = now or datetime.now(timezone.utc)
+        base = self.intervals[state["source"]]
+        interval = next_interval(state.get("interval", base), base, outcome)
+        failures = state.get("failures", 0) + 1 if outcome == FAILED else 0
+        unchanged_runs = state.get("unchanged_runs", 0) + 1 if outcome == UNCHANGED else 0
+        next_run_at = now + timedelta(seconds=next_delay(interval, failures))
+        self.collection.update_one(
+            {"_id": _state_id(state["source"]), "owner": self.owner},
+            {"$set": {
+                "interval": interval, "failures": failures, "unchanged_runs": unchanged_runs,
+                "next_run_at": next_run_at, "last_finished_at": now, "last_outcome": outcome,
+                "last_summary": summary, "running": False, "owner": None, "lease_expires_at": None,
+            }}
+        )
+        return next_run_at
+
+    def run_source(self, state):
+        name = state["source"]
+        outcome, summary = FAILED, None
+        try:
+            summaries = self.run(name)
+            outcome = run_outcome(summaries, name)
+            summary = {str(key): value for key, value in summaries.items()}
+        except Exception as e:
+            print(f"Error: scheduled run of '{name}' failed: {e!r}")
+        finally:
+            try:
+                next_run_at = self.complete(state, outcome, summary)
+                print(f"Scheduler: '{name}' {outcome}, next run at {next_run_at.isoformat(timespec='seconds')}")
+            except PyMongoError as e:
+                print(f"Error: could not record the run of '{name}' (the lease will expire): {e}")
+            with self._lock:
+                self._running.discard(name)
+            self._wakeup.set()
+
+    def tick(self, now=None):
+        """
+        Start every due source not already running.
+        :return: Names of the sources started.
+        """
+        now = now or datetime.now(timezone.utc)
+        started = []
+        due = self.collection.find(
+            {"_id": {"$in": [_state_id(name) for name in self.intervals]}, "next_run_at": {"$lte": now}},
+            {"source": 1}
+        )
+        for doc in due:
+            name = doc["source"]
+            with self._lock:
+                if name in self._running:
+                    continue
+                state = self.claim(name, now)
+                if state is None:
+                    continue
+                self._running.add(name)
+            self._executor.submit(self.run_source, state)
+            started.append(name)
+        return started
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        doc = self.collection.find_one(
+            {"_id": {"$in": [_state_id(name) for name in self.intervals]}, "running": False},
+            {"next_run_at": 1}, sort=[("next_run_at", 1)]
+        )
+        if doc is None:
+            return SCHEDULE_POLL_SECONDS
+        next_run_at = doc["next_run_at"]
+        if next_run_at.tzinfo is None:
+            next_run_at = next_run_at.replace(tzinfo=timezone.utc)
+        return min(max((next_run_at - now).total_seconds(), 0), SCHEDULE_POLL_SECONDS)
+
+    def run_forever(self):
+        """
+        Run due sources until stop() is called, then wait for the runs in flight.
+        """
+        self.setup()
+        print(f"Scheduler {self.owner} started for {len(self.intervals)} sources.")
+        while not self.stopping.is_set():
+            try:
+                self.tick()
+                delay = self.seconds_until_next()
+            except PyMongoError as e:
+                print(f"Error: scheduler could not reach MongoDB: {e}")
+                delay = SCHEDULE_POLL_SECONDS
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+        self._executor.shutdown(wait=True)
+        print("Scheduler stopped.")
+
+    def stop(self, *_):
+        self.stopping.set()
+        self._wakeup.set()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db import get_database
+    from etl_pipeline import run_etl
+    from metrics import serve
+
+    parser = argparse.ArgumentParser(description="Run the trends ETL on per-source adaptive intervals.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("run", help="Run the scheduler until SIGTERM/SIGINT (needs RAPIDAPI_KEY).")
+    subparsers.add_parser("status", help="Print the state and next run of every source.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        api_key = os.environ["RAPIDAPI_KEY"]
+        # ETL stage, record and MongoDB metrics of every run
+        serve()
+        scheduler = Scheduler(get_database(), lambda name: run_etl(api_key, sources=[name]))
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+        scheduler.run_forever()
+    else:
+        for state in Scheduler(get_database(), None).state():
+            print(f"{state['source']:<18} next {state['next_run_at']:%Y-%m-%d %H:%M:%S}  "
+                  f"interval {state['interval']:.0f}s  last {state.get('last_outcome', '-')}"
+                  f"{'  running' if state.get('running') else ''}")
@@ -0,0 +1,233 @@
+import threading
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+
+from enrichment import HASH_FIELD
+from models import _lookup
+from registry import COLLECTIONS
+from transform_data import FINGERPRINT_FIELD
+
+# Sources linked by the cross-platform index.
+# terms: key paths of the text naming the entity (a string or a list of strings).
+# summary: fields of each document returned in the cross-platform view.
+SEARCH_SOURCES = {
+    "tweeter": {"terms": ("name",), "summary": ("name", "post_count", "rank", "location_id")},
+    "hashtag": {"terms": ("name",), "summary": ("name", "tweet_volume", "url")},
+    "tiktok": {
+        "terms": ("tag", ("hashtags", "trending"), ("hashtags", "viral"), ("hashtags", "recommended")),
+        "summary": ("tag",),
+    },
+    "trending_keywords": {
+        "terms": ("keyword",),
+        "summary": ("keyword", "like", "share", "impression", "trending_score", "sentiment", "topic"),
+    },
+    "trending_hashtags": {
+        "terms": ("hashtag_name",),
+        "summary": ("hashtag_name", "country_id", "rank", "publish_cnt", "video_views"),
+    },
+    "google_trends": {"terms": ("query",), "summary": ("query", "region_code", "formatted_traffic", "sentiment", "topic")},
+}
+
+# Number of documents fetched per $in query when refreshing
+REFRESH_BATCH_SIZE = 1000
+
+
+def normalize_key(text):
+    """
+    Normalize a trend name to the key linking it across platforms: accents, case, '#'/'@',
+    spacing and punctuation are dropped. "#WorldCup", "World Cup" and "world-cup" give "worldcup".
+    :return: The key, empty if the text holds no letter or digit.
+    """
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text.casefold() if char.isalnum())
+
+
+def _path(path):
+    return path if isinstance(path, str) else ".".join(path)
+
+
+def document_keys(source, doc):
+    """
+    Return the distinct keys of the entities a document names.
+    """
+    keys = set()
+    for path in SEARCH_SOURCES[source]["terms"]:
+        value = _lookup(doc, path)
+        for text in value if isinstance(value, list) else (value,):
+            key = normalize_key(text)
+            if key:
+                keys.add(key)
+    return tuple(sorted(keys))
+
+
+class SearchIndex:
+    """
+    In-memory index of the entities of every SEARCH_SOURCES collection, by normalized key.
+    Keys are held in a sorted array: a prefix matches a contiguous range found by binary search,
+    ranked by a parallel weight array (number of platforms, then of documents).
+    Refreshes only read the documents whose content changed since the previous one; readers
+    are never blocked, entities being replaced rather than modified in place.
+    """
+
+    def __init__(self):
+        self.generation = None
+        self._entities = {}  # key -> {source: {doc_id: summary}}
+        self._documents = {source: {} for source in SEARCH_SOURCES}  # doc_id -> (signature, keys)
+        self._sorted = ((), np.empty(0))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sorted[0])
+
+    def refresh(self, db, generation=None):
+        """
+        Bring the index up to date with the collections.
+        :param db: MongoDB database.
+        :param generation: ETL generation the index reflects once refreshed.
+        :return: Dictionary with the number of documents read and removed.
+        """
+        with self._lock:
+            stats = {"read": 0, "removed": 0}
+            changed = set()
+            for source in SEARCH_SOURCES:
+                self._refresh_source(db, source, changed, stats)
+            if changed:
+                self._update_arrays(changed)
+            self.generation = generation
+            return stats
+
+    def _refresh_source(self, db, source, changed, stats):
+        collection = db[COLLECTIONS[source]["collection"]]
+        known = self._documents[source]
+        signatures = {
+            doc["_id"]: (doc.get(FINGERPRINT_FIELD), doc.get(HASH_FIELD))
+            for doc in collection.find({}, {FINGERPRINT_FIELD: 1, HASH_FIELD: 1})
+        }
+        # Documents without a fingerprint (written outside the ETL) cannot be compared: always re-read
+        stale = [doc_id for doc_id, signature in signatures.items()
+                 if doc_id not in known or known[doc_id][0] != signature or signature == (None, None)]
+        removed = [doc_id for doc_id in known if doc_id not in signatures]
+
+        spec = SEARCH_SOURCES[source]
+        projection = dict.fromkeys([_path(path) for path in spec["terms"]] + list(spec["summary"]), 1)
+        for start in range(0, len(stale), REFRESH_BATCH_SIZE):
+            for doc in collection.find({"_id": {"$in": stale[start:start + REFRESH_BATCH_SIZE]}}, projection):
+                keys = document_keys(source, doc)
+                summary = {field: doc.get(field) for field in spec["summary"]}
+                self._unlink(source, doc["_id"], changed)
+                for key in keys:
+                    self._link(key, source, doc["_id"], summary, changed)
+                known[doc["_id"]] = (signatures[doc["_id"]], keys)
+                stats["read"] += 1
+        for doc_id in removed:
+            self._unlink(source, doc_id, changed)
+            del known[doc_id]
+            stats["removed"] += 1
+
+    def _link(self, key, source, doc_id, summary, changed):
+        entity = dict(self._entities.get(key, {}))
+        entity[source] = {**entity.get(source, {}), doc_id: summary}
+        self._entities[key] = entity
+        changed.add(key)
+
+    def _unlink(self, source, doc_id, changed):
+        previous = self._documents[source].get(doc_id)
+        for key in previous[1] if previous else ():
+            entity = dict(self._entities[key])
+            docs = {other: summary for other, summary in entity[source].items() if other != doc_id}
+            if docs:
+                entity[source] = docs
+            else:
+                del entity[source]
+            if entity:
+                self._entities[key] = entity
+            else:
+                del self._entities[key]
+            changed.add(key)
+
+    @staticmethod
+    def _weight(entity):
+        # Platforms count first; documents break ties within [0, 1)
+        documents = sum(map(len, entity.values()))
+        return len(entity) + documents / (documents + 1)
+
+    def _update_arrays(self, changed):
+        """
+        Apply the changed keys to the sorted arrays: in place for a small delta, by a full sort otherwise.
+        """
+        keys, weights = self._sorted
+        if len(changed) > max(len(keys) // 100, 1):
+            keys = sorted(self._entities)
+            weights = np.fromiter((self._weight(self._entities[key]) for key in keys), dtype=float, count=len(keys))
+            self._sorted = (keys, weights)
+            return
+        keys, weights = list(keys), weights.copy()
+        for key in sorted(changed):
+            position = bisect_left(keys, key)
+            present = position < len(keys) and keys[position] == key
+            entity = self._entities.get(key)
+            if entity is None:
+                if present:
+                    del keys[position]
+                    weights = np.delete(weights, position)
+            elif present:
+                weights[position] = self._weight(entity)
+            else:
+                keys.insert(position, key)
+                weights = np.insert(weights, position, self._weight(entity))
+        self._sorted = (keys, weights)
+
+    def _describe(self, key, entity):
+        names = [summary[field] for source, docs in entity.items() for summary in docs.values()
+                 for field in SEARCH_SOURCES[source]["summary"][:1] if isinstance(summary.get(field), str)]
+        return {
+            "key": key,
+            "name": max(set(names), key=names.count) if names else key,
+            "sources": sorted(entity),
+            "documents": sum(map(len, entity.values())),
+        }
+
+    def search(self, prefix, limit=10):
+        """
+        Autocomplete a query: the `limit` entities whose key starts with its normalized form,
+        present on the most platforms first.
+        :return: List of {"key", "name", "sources", "documents"} dictionaries.
+        """
+        keys, weights = self._sorted
+        prefix = normalize_key(prefix)
+        if not prefix or limit <= 0:
+            return []
+        low = bisect_left(keys, prefix)
+        high = bisect_left(keys, prefix + "\U0010ffff", low)
+        window = weights[low:high]
+        if len(window) > limit:
+            # Keep key order among the selected entities so that ties stay alphabetical
+            best = np.sort(np.argpartition(-window, limit - 1)[:limit])
+        else:
+            best = np.arange(len(window))
+        indices = low + best[np.argsort(-window[best], kind="stable")]
+        results = []
+        for index in indices:
+            entity = self._entities.get(keys[index])
+            if entity is not None:
+                results.append(self._describe(keys[index], entity))
+        return results
+
+    def entity(self, key):
+        """
+        Cross-platform view of an entity: its documents on every platform.
+        :param key: Entity key, or any spelling of its name.
+        :return: Dictionary with the entity description and "platforms" (source -> document summaries),
+                 or None if no platform knows it.
+        """
+        key = normalize_key(key)
+        entity = self._entities.get(key)
+        if entity is None:
+            return None
+        view = self._describe(key, entity)
+        view["platforms"] = {source: list(docs.values()) for source, docs in entity.items()}
+        return view
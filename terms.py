@@ -0,0 +1,104 @@
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+# Collection holding the term frequencies of the last run, one document per source
+TERMS_COLLECTION = "term_frequencies"
+
+# Number of most frequent terms stored per source
+TERMS_MAX_TERMS = int(os.getenv("TERMS_MAX_TERMS", "500"))
+
+# Text fields counted per source
+TERM_FIELDS = {
+    "tweeter": ("name",),
+    "hashtag": ("name",),
+    "trending_keywords": ("keyword",),
+    "trending_hashtags": ("hashtag_name",),
+    "youtube": ("title",),
+}
+
+# Words carrying no topic, in the languages of the tracked trends
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its me my new no not of on or our so
+that the this to up us was we what when who why will with you your
+au aux avec ce ces dans de des du elle en est et il je la le les leur lui ma mais me mes mon ne nous
+on ou par pas pour qui sa se son sur ta te tes toi ton tu un une vos votre vous
+""".split())
+
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+
+def tokenize(text):
+    """
+    Split a trend name, keyword or title into lowercase terms, without stopwords, numbers
+    or single characters. "#WorldCup2026" gives ["worldcup2026"].
+    """
+    if not isinstance(text, str):
+        return []
+    return [
+        word for word in _WORD.findall(text.lower())
+        if len(word) > 1 and not word.isdigit() and word not in STOPWORDS
+    ]
+
+
+class TermCounter:
+    """
+    Term frequencies of the records ingested during one ETL run, per source.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def observe(self, source, records):
+        """
+        Yield records unchanged while counting the terms of their text fields.
+        Counts are merged once the records are exhausted, so concurrent sources do not contend.
+        """
+        fields = TERM_FIELDS.get(source)
+        if not fields:
+            yield from records
+            return
+        counts = Counter()
+        for record in records:
+            for field in fields:
+                counts.update(tokenize(record.get(field)))
+            yield record
+        with self._lock:
+            self._counts.setdefault(source, Counter()).update(counts)
+
+    def counts(self, source):
+        with self._lock:
+            return Counter(self._counts.get(source, ()))
+
+    def save(self, db, max_terms=TERMS_MAX_TERMS):
+        """
+        Replace the stored frequencies of every source counted during the run.
+        Sources that were not ingested (e.g. a failed fetch) keep their previous frequencies.
+        :return: Number of sources written.
+        """
+        updated_at = datetime.now(timezone.utc)
+        with self._lock:
+            counted = {source: counts.most_common(max_terms) for source, counts in self._counts.items()}
+        for source, top in counted.items():
+            db[TERMS_COLLECTION].replace_one(
+                {"_id": source},
+                {"terms": [{"term": term, "count": count} for term, count in top], "updated_at": updated_at},
+                upsert=True
+            )
+        return len(counted)
+
+
+def merge_terms(docs, limit):
+    """
+    Merge the stored frequencies of several sources and keep the `limit` most frequent terms.
+    :param docs: Documents of TERMS_COLLECTION.
+    :return: List of {"term", "count"} dictionaries, most frequent first.
+    """
+    total = Counter()
+    for doc in docs:
+        for item in doc.get("terms", []):
+            total[item["term"]] += item["count"]
+    return [{"term": term, "count": count} for term, count in total.most_common(limit)]
@@ -1,8 +1,66 @@
+import hashlib
 import http.client
 import json
 from datetime import datetime
 
+import ijson
+
+from models import (
+    GoogleRegion,
+    GoogleTrend,
+    TikTokTagMetrics,
+    TrendingAd,
+    TrendingHashtag,
+    TrendingKeyword,
+    TwitterHashtag,
+    TwitterLocation,
+    TwitterTrend,
+    YoutubeVideo,
+    to_float
+)
+
+# Field holding the content fingerprint of a stored record
+FINGERPRINT_FIELD = "content_hash"
+
+def content_fingerprint(record):
+    """
+    Compute a stable fingerprint of a transformed record.
+    Key order does not matter; the fingerprint field itself is ignored.
+    :param record: Dictionary produced by a transform_* function.
+    :return: Hex digest identifying the record content.
+    """
+    content = {k: v for k, v in record.items() if k != FINGERPRINT_FIELD}
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+# Weights of the keyword trending score
+TRENDING_SCORE_WEIGHTS = {"like": 0.5, "share": 0.3, "impression": 0.2}
+
+def compute_trending_score(record, weights=TRENDING_SCORE_WEIGHTS):
+    """
+    Compute the weighted engagement score of a trending keyword.
+    :param record: Dictionary with like, share and impression fields.
+    :param weights: Weight of each field.
+    :return: Trending score as a float.
+    """
+    return sum(to_float(record.get(field)) * weight for field, weight in weights.items())
+
 ## Transformation :
+# Each source has a record builder for one raw item, a generator yielding records one
+# at a time, and the list-returning transform_* function wrapping the generator.
+# Record builders go through the typed models of models.py, so counts are stored as numbers.
+
+def _twitter_trend_record(trend):
+    return TwitterTrend.from_raw(trend).to_dict()
+
+def iter_twitter_trends_data(trends_data):
+    """
+    Yield Twitter trending topics in a unified format, one at a time.
+    :param trends_data: Raw JSON data from the API.
+    """
+    if trends_data.get("status") == "SUCCESS":
+        for trend in trends_data.get("trending", {}).get("trends", []):
+            yield _twitter_trend_record(trend)
 
 def transform_twitter_trends_data(trends_data):
     """
@@ -10,19 +68,19 @@ def transform_twitter_trends_data(trends_data):
     :param trends_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data.
     """
-    transformed_data = []
-    if trends_data.get("status") == "SUCCESS":
-        trends = trends_data.get("trending", {}).get("trends", [])
-        for trend in trends:
-            transformed_data.append({
-                "name": trend.get("name"),
-                "post_count": trend.get("postCount"),
-                "domain": trend.get("domain"),
-                "rank": trend.get("rank"),
-                "mobile_url": trend.get("mobileIntent"),
-                "web_url": trend.get("webUrl")
-            })
-    return transformed_data
+    return list(iter_twitter_trends_data(trends_data))
+
+def _twitter_location_record(location):
+    return TwitterLocation.from_raw(location).to_dict()
+
+def iter_twitter_locations_data(locations_data):
+    """
+    Yield Twitter locations in a unified format, one at a time.
+    :param locations_data: Raw JSON data from the API.
+    """
+    if locations_data.get("status") == "SUCCESS":
+        for location in locations_data.get("locations", []):
+            yield _twitter_location_record(location)
 
 def transform_twitter_locations_data(locations_data):
     """
@@ -30,16 +88,19 @@ def transform_twitter_locations_data(locations_data):
     :param locations_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data.
     """
-    transformed_data = []
-    if locations_data.get("status") == "SUCCESS":
-        locations = locations_data.get("locations", [])
-        for location in locations:
-            transformed_data.append({
-                "name": location.get("name"),
-                "place_id": location.get("placeID"),
-                "location_type": location.get("locationType")
-            })
-    return transformed_data
+    return list(iter_twitter_locations_data(locations_data))
+
+def _twitter_hashtag_record(hashtag):
+    return TwitterHashtag.from_raw(hashtag).to_dict()
+
+def iter_twitter_hashtags_data(hashtags_data):
+    """
+    Yield Twitter trending hashtags in a unified format, one at a time.
+    :param hashtags_data: Raw JSON data from the API.
+    """
+    if hashtags_data.get("success"):
+        for hashtag in hashtags_data.get("data", []):
+            yield _twitter_hashtag_record(hashtag)
 
 def transform_twitter_hashtags_data(hashtags_data):
     """
@@ -47,17 +108,7 @@ def transform_twitter_hashtags_data(hashtags_data):
     :param hashtags_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data.
     """
-    transformed_data = []
-    if hashtags_data.get("success"):
-        hashtags = hashtags_data.get("data", [])
-        for hashtag in hashtags:
-            transformed_data.append({
-                "name": hashtag.get("name"),
-                "url": hashtag.get("url"),
-                "tweet_volume": hashtag.get("tweet_volume"),
-                "update_time": hashtag.get("agencyDataUpdateTime")
-            })
-    return transformed_data
+    return list(iter_twitter_hashtags_data(hashtags_data))
 
 def transform_tiktok_tags_data(tags_data):
     """
@@ -103,44 +154,57 @@ def transform_tiktok_tags_data(tags_data):
 
         # Extract metrics
         metrics = result.get("metrics", {})
-        transformed_data["metrics"] = {
-            "trending_score": metrics.get("trendingScore", ""),
-            "viral_potential": metrics.get("viralPotential", ""),
-            "reach_estimate": metrics.get("reachEstimate", ""),
-            "competition_level": metrics.get("competitionLevel", "")
-        }
+        transformed_data["metrics"] = TikTokTagMetrics.from_raw(metrics).to_dict()
 
     return transformed_data
 
+# Tag the TikTok tag generator is queried for (generate_tiktok_tags' default), key of the stored document
+TIKTOK_TAG = "viral"
+
+def transform_tiktok_tags_records(tags_data, tag=TIKTOK_TAG):
+    """
+    Transform TikTok tags data into the records ingest expects: one document per queried tag.
+    :param tags_data: Raw JSON data from the API.
+    :param tag: Tag the data was generated for, stored as the document key.
+    :return: List with the transformed data of the tag, empty if the API request failed.
+    """
+    if tags_data.get("status") != "success":
+        return []
+    return [dict(transform_tiktok_tags_data(tags_data), tag=tag)]
+
+def _trending_keyword_record(keyword_data):
+    record = TrendingKeyword.from_raw(keyword_data).to_dict()
+    record["trending_score"] = compute_trending_score(record)
+    return record
+
+def iter_trending_keywords_data(keywords_data):
+    """
+    Yield trending keywords in a unified format, one at a time.
+    :param keywords_data: Raw JSON data from the API.
+    """
+    if keywords_data.get("code") == 0:  # Check if the API request was successful
+        for keyword_data in keywords_data.get("data", {}).get("keyword_list", []):
+            yield _trending_keyword_record(keyword_data)
+
 def transform_trending_keywords_data(keywords_data):
     """
     Transform trending keywords data into a unified format.
     :param keywords_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each keyword.
     """
-    transformed_data = []
+    return list(iter_trending_keywords_data(keywords_data))
 
-    if keywords_data.get("code") == 0:  # Check if the API request was successful
-        keyword_list = keywords_data.get("data", {}).get("keyword_list", [])
-
-        for keyword_data in keyword_list:
-            transformed_data.append({
-                "keyword": keyword_data.get("keyword", ""),
-                "comment": keyword_data.get("comment", 0),
-                "cost": keyword_data.get("cost", 0),
-                "cpa": keyword_data.get("cpa", 0),
-                "ctr": keyword_data.get("ctr", 0),
-                "cvr": keyword_data.get("cvr", 0),
-                "impression": keyword_data.get("impression", 0),
-                "like": keyword_data.get("like", 0),
-                "play_six_rate": keyword_data.get("play_six_rate", 0),
-                "post": keyword_data.get("post", 0),
-                "post_change": keyword_data.get("post_change", 0),
-                "share": keyword_data.get("share", 0),
-                "video_list": "; ".join(keyword_data.get("video_list", []))  # Convert list to a string
-            })
+def _trending_ad_record(ad):
+    return TrendingAd.from_raw(ad).to_dict()
 
-    return transformed_data
+def iter_trending_ads_data(ads_data):
+    """
+    Yield trending ads in a unified format, one at a time.
+    :param ads_data: Raw JSON data from the API.
+    """
+    if ads_data.get("code") == 0:  # Check if the API request was successful
+        for ad in ads_data.get("data", {}).get("materials", []):
+            yield _trending_ad_record(ad)
 
 def transform_trending_ads_data(ads_data):
     """
@@ -148,33 +212,19 @@ def transform_trending_ads_data(ads_data):
     :param ads_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each ad.
     """
-    transformed_data = []
+    return list(iter_trending_ads_data(ads_data))
 
-    if ads_data.get("code") == 0:  # Check if the API request was successful
-        materials = ads_data.get("data", {}).get("materials", [])
-
-        for ad in materials:
-            video_info = ad.get("video_info", {})
-            transformed_data.append({
-                "ad_title": ad.get("ad_title", ""),
-                "brand_name": ad.get("brand_name", ""),
-                "cost": ad.get("cost", 0),
-                "ctr": ad.get("ctr", 0),
-                "favorite": ad.get("favorite", False),
-                "id": ad.get("id", ""),
-                "industry_key": ad.get("industry_key", ""),
-                "is_search": ad.get("is_search", False),
-                "like": ad.get("like", 0),
-                "objective_key": ad.get("objective_key", ""),
-                "video_id": video_info.get("vid", ""),
-                "video_duration": video_info.get("duration", 0),
-                "video_cover": video_info.get("cover", ""),
-                "video_url_720p": video_info.get("video_url", {}).get("720p", ""),
-                "video_width": video_info.get("width", 0),
-                "video_height": video_info.get("height", 0)
-            })
+def _trending_hashtag_record(hashtag):
+    return TrendingHashtag.from_raw(hashtag).to_dict()
 
-    return transformed_data
+def iter_trending_hashtags_data(hashtags_data):
+    """
+    Yield trending hashtags in a unified format, one at a time.
+    :param hashtags_data: Raw JSON data from the API.
+    """
+    if hashtags_data.get("code") == 0:  # Check if the API request was successful
+        for hashtag in hashtags_data.get("data", {}).get("list", []):
+            yield _trending_hashtag_record(hashtag)
 
 def transform_trending_hashtags_data(hashtags_data):
     """
@@ -182,44 +232,19 @@ def transform_trending_hashtags_data(hashtags_data):
     :param hashtags_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each hashtag.
     """
-    transformed_data = []
+    return list(iter_trending_hashtags_data(hashtags_data))
 
-    if hashtags_data.get("code") == 0:  # Check if the API request was successful
-        hashtag_list = hashtags_data.get("data", {}).get("list", [])
-
-        for hashtag in hashtag_list:
-            # Extract trend data
-            trend_data = []
-            for trend_point in hashtag.get("trend", []):
-                trend_data.append({
-                    "time": trend_point.get("time", 0),
-                    "value": trend_point.get("value", 0)
-                })
-
-            # Extract creators data
-            creators_data = []
-            for creator in hashtag.get("creators", []):
-                creators_data.append({
-                    "nick_name": creator.get("nick_name", ""),
-                    "avatar_url": creator.get("avatar_url", "")
-                })
-
-            transformed_data.append({
-                "hashtag_id": hashtag.get("hashtag_id", ""),
-                "hashtag_name": hashtag.get("hashtag_name", ""),
-                "country_id": hashtag.get("country_info", {}).get("id", ""),
-                "country_name": hashtag.get("country_info", {}).get("value", ""),
-                "is_promoted": hashtag.get("is_promoted", False),
-                "trend": trend_data,
-                "creators": creators_data,
-                "publish_cnt": hashtag.get("publish_cnt", 0),
-                "video_views": hashtag.get("video_views", 0),
-                "rank": hashtag.get("rank", 0),
-                "rank_diff": hashtag.get("rank_diff", 0),
-                "rank_diff_type": hashtag.get("rank_diff_type", 0)
-            })
+def _youtube_video_record(video):
+    return YoutubeVideo.from_raw(video).to_dict()
 
-    return transformed_data
+def iter_youtube_videos_data(videos_data):
+    """
+    Yield YouTube trending videos in a unified format, one at a time.
+    :param videos_data: Raw JSON data from the API.
+    """
+    if videos_data.get("data"):  # Check if the API request was successful
+        for video in videos_data.get("data", []):
+            yield _youtube_video_record(video)
 
 def transform_youtube_videos_data(videos_data):
     """
@@ -227,38 +252,19 @@ def transform_youtube_videos_data(videos_data):
     :param videos_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each video.
     """
-    transformed_data = []
+    return list(iter_youtube_videos_data(videos_data))
 
-    if videos_data.get("data"):  # Check if the API request was successful
-        for video in videos_data.get("data", []):
-            # Extract channel thumbnail
-            channel_thumbnail = video.get("channelThumbnail", [{}])[0].get("url", "")
-
-            # Extract video thumbnails
-            thumbnails = []
-            for thumbnail in video.get("thumbnail", []):
-                thumbnails.append({
-                    "url": thumbnail.get("url", ""),
-                    "width": thumbnail.get("width", 0),
-                    "height": thumbnail.get("height", 0)
-                })
-
-            transformed_data.append({
-                "video_id": video.get("videoId", ""),
-                "title": video.get("title", ""),
-                "channel_title": video.get("channelTitle", ""),
-                "channel_id": video.get("channelId", ""),
-                "channel_handle": video.get("channelHandle", ""),
-                "channel_thumbnail": channel_thumbnail,
-                "description": video.get("description", ""),
-                "view_count": video.get("viewCount", ""),
-                "published_time_text": video.get("publishedTimeText", ""),
-                "publish_date": video.get("publishDate", ""),
-                "length_text": video.get("lengthText", ""),
-                "thumbnails": thumbnails
-            })
+def _google_trend_record(item):
+    return GoogleTrend.from_raw(item).to_dict()
 
-    return transformed_data
+def iter_google_trends_data(trends_data):
+    """
+    Yield Google Trends queries in a unified format, one at a time.
+    :param trends_data: Raw JSON data from the API.
+    """
+    if trends_data.get("status") == "success":  # Check if the API request was successful
+        for item in trends_data.get("items", []):
+            yield _google_trend_record(item)
 
 def transform_google_trends_data(trends_data):
     """
@@ -266,41 +272,19 @@ def transform_google_trends_data(trends_data):
     :param trends_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each trending query.
     """
-    transformed_data = []
+    return list(iter_google_trends_data(trends_data))
 
-    if trends_data.get("status") == "success":  # Check if the API request was successful
-        for item in trends_data.get("items", []):
-            # Extract image details
-            image_data = item.get("image", {})
-            image_info = {
-                "news_url": image_data.get("newsUrl", ""),
-                "source": image_data.get("source", ""),
-                "image_url": image_data.get("imageUrl", "")
-            }
-
-            # Extract articles
-            articles_data = []
-            for article in item.get("articles", []):
-                article_image = article.get("image", {})
-                articles_data.append({
-                    "title": article.get("title", ""),
-                    "time_ago": article.get("timeAgo", ""),
-                    "source": article.get("source", ""),
-                    "news_url": article_image.get("newsUrl", ""),
-                    "image_url": article_image.get("imageUrl", ""),
-                    "url": article.get("url", ""),
-                    "snippet": article.get("snippet", "")
-                })
-
-            transformed_data.append({
-                "query": item.get("query", ""),
-                "formatted_traffic": item.get("formattedTraffic", ""),
-                "related_queries": item.get("relatedQueries", []),
-                "image": image_info,
-                "articles": articles_data
-            })
+def _google_region_record(region):
+    return GoogleRegion.from_raw(region).to_dict()
 
-    return transformed_data
+def iter_google_regions_data(regions_data):
+    """
+    Yield Google Trends regions in a unified format, one at a time.
+    :param regions_data: Raw JSON data from the API.
+    """
+    if regions_data.get("status") == "success":  # Check if the API request was successful
+        for region in regions_data.get("regions", []):
+            yield _google_region_record(region)
 
 def transform_google_regions_data(regions_data):
     """
@@ -308,13 +292,61 @@ def transform_google_regions_data(regions_data):
     :param regions_data: Raw JSON data from the API.
     :return: List of dictionaries containing transformed data for each region.
     """
-    transformed_data = []
-
-    if regions_data.get("status") == "success":  # Check if the API request was successful
-        for region in regions_data.get("regions", []):
-            transformed_data.append({
-                "code": region.get("code", ""),
-                "name": region.get("name", "")
-            })
-
-    return transformed_data
\ No newline at end of file
+    return list(iter_google_regions_data(regions_data))
+
+## Streaming :
+
+# Per source: (ijson prefix of the raw items, top-level success key, success test, record builder).
+# A None success key means the presence of items is the success signal.
+STREAM_SPECS = {
+    "tweeter": ("trending.trends.item", "status", lambda value: value == "SUCCESS", _twitter_trend_record),
+    "location": ("locations.item", "status", lambda value: value == "SUCCESS", _twitter_location_record),
+    "hashtag": ("data.item", "success", bool, _twitter_hashtag_record),
+    "trending_keywords": ("data.keyword_list.item", "code", lambda value: value == 0, _trending_keyword_record),
+    "trending_ads": ("data.materials.item", "code", lambda value: value == 0, _trending_ad_record),
+    "trending_hashtags": ("data.list.item", "code", lambda value: value == 0, _trending_hashtag_record),
+    "youtube": ("data.item", None, None, _youtube_video_record),
+    "google_trends": ("items.item", "status", lambda value: value == "success", _google_trend_record),
+    "google_regions": ("regions.item", "status", lambda value: value == "success", _google_region_record),
+}
+
+_UNSEEN = object()
+
+def iter_stream_records(stream, source):
+    """
+    Yield transformed records straight from a JSON response stream, without decoding it whole.
+    Items are parsed incrementally and transformed one at a time. Items seen before the
+    success flag are held back until the flag is read; records are dropped if it reports a failure.
+    :param stream: Binary file-like object with the raw JSON response.
+    :param source: Source name, a key of STREAM_SPECS.
+    """
+    prefix, status_key, is_success, to_record = STREAM_SPECS[source]
+    status = _UNSEEN if status_key else True
+    pending = []
+    builder = None
+    depth = 0
+
+    for path, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+            if depth == 0:
+                record = to_record(builder.value)
+                builder = None
+                if status is _UNSEEN:
+                    pending.append(record)
+                else:
+                    yield record
+        elif path == prefix and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            depth = 1
+        elif status is _UNSEEN and path == status_key and event not in ("start_map", "start_array"):
+            if not is_success(value):
+                return
+            status = True
+            yield from pending
+            pending = []